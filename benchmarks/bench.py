@@ -0,0 +1,193 @@
+# Benchmarks of the hot paths: forces, integration, collisions and rendering
+#
+#     python benchmarks/bench.py --output results.json
+#     python benchmarks/bench.py --baseline results.json --threshold 0.2
+#
+# Every stage runs on seeded SystemGenerator systems of increasing size. The
+# results (seconds per call, ns per interaction, steps per second, peak
+# memory) and the scaling exponent of each stage (slope of log(time) against
+# log(N)) are printed and saved as JSON. With --baseline, a stage slower than
+# the baseline by more than the threshold is reported and the exit code is 1.
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+# Rendering runs offscreen
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from nbody.core import GravitationalSystem, Simulation, SystemGenerator
+from nbody.window import MainWindow
+from nbody.barnes_hut import BarnesHutEngine
+from nbody.integrators import make_integrator
+
+SIZES = (10, 100, 1000, 10000, 100000)
+
+
+def setup_pair_force(objects):
+    # The original per-pair force, called for every ordered pair
+    system = GravitationalSystem(objects)
+    bodies = list(system.objects)
+    calculate = system.calculate_gravitational_force
+
+    def run():
+        for i, obj1 in enumerate(bodies):
+            for j, obj2 in enumerate(bodies):
+                if i != j:
+                    calculate(obj1, obj2)
+    return run, len(bodies) * (len(bodies) - 1)
+
+
+def setup_direct_force(objects):
+    system = GravitationalSystem(objects)
+    return (lambda: system.update_velocities(1.0)), len(objects) * (len(objects) - 1)
+
+
+def setup_tree_force(objects):
+    system = GravitationalSystem(objects, BarnesHutEngine(theta=0.5))
+    return (lambda: system.update_velocities(1.0)), None
+
+
+def setup_integration(objects):
+    simulation = Simulation(objects, 86400.0, BarnesHutEngine(theta=0.5), make_integrator("leapfrog"))
+    return simulation.step, None
+
+
+def setup_collisions(objects):
+    simulation = Simulation(objects, 86400.0)
+    return simulation.update_objects_positions, None
+
+
+def setup_rendering(objects):
+    window = MainWindow(800, 600, 60, "benchmark", objects, 86400.0, 1e12)
+    # Every call draws the same snapshot, which the projection cache would
+    # otherwise serve without projecting it
+    return (lambda: window.draw_objects(cache=False)), None
+
+
+# Stage name: (setup function, largest N)
+STAGES = {
+    "force.pair": (setup_pair_force, 1000),
+    "force.direct": (setup_direct_force, 10000),
+    "force.barnes_hut": (setup_tree_force, 100000),
+    "integration.leapfrog": (setup_integration, 100000),
+    "collisions": (setup_collisions, 100000),
+    "rendering": (setup_rendering, 100000),
+}
+
+
+def measure(function, min_time, max_repeats):
+    """Best time of several calls, repeated until min_time has been spent."""
+    function()
+    times = []
+    spent = 0.0
+    while spent < min_time and len(times) < max_repeats:
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+        spent += times[-1]
+    return min(times)
+
+
+def peak_memory(function):
+    tracemalloc.start()
+    try:
+        function()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def scaling_exponent(results):
+    sizes = [result["n"] for result in results if result["seconds"] > 0]
+    if len(sizes) < 2:
+        return None
+    times = [result["seconds"] for result in results if result["seconds"] > 0]
+    return float(np.polyfit(np.log(sizes), np.log(times), 1)[0])
+
+
+def run_benchmarks(stages, sizes, seed, min_time, max_repeats):
+    results = []
+    for stage in stages:
+        setup, largest = STAGES[stage]
+        for n in sizes:
+            if n > largest:
+                continue
+            objects = SystemGenerator(n, False, seed=seed).generate_system()
+            function, interactions = setup(objects)
+            seconds = measure(function, min_time, max_repeats)
+            # Fresh state, so that the memory of the first call (allocations included) is measured
+            function, _ = setup(SystemGenerator(n, False, seed=seed).generate_system())
+            result = {
+                "stage": stage,
+                "n": n,
+                "seconds": seconds,
+                "steps_per_second": 1 / seconds if seconds > 0 else None,
+                "ns_per_interaction": seconds / interactions * 1e9 if interactions else None,
+                "peak_bytes": peak_memory(function),
+            }
+            results.append(result)
+            print(f"{stage:>22} N={n:<7} {seconds * 1e3:10.3f} ms  {result['steps_per_second']:10.2f} /s"
+                  + (f"  {result['ns_per_interaction']:8.2f} ns/interaction" if interactions else "")
+                  + f"  peak {result['peak_bytes'] / 2**20:8.1f} MiB", flush=True)
+    return results
+
+
+def compare(results, baseline, threshold):
+    """Stages slower than the baseline by more than threshold (relative)."""
+    reference = {(result["stage"], result["n"]): result["seconds"] for result in baseline["results"]}
+    regressions = []
+    for result in results:
+        before = reference.get((result["stage"], result["n"]))
+        if before and result["seconds"] > before * (1 + threshold):
+            regressions.append((result["stage"], result["n"], before, result["seconds"]))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks of the force, integration, collision and rendering paths")
+    parser.add_argument("--stages", nargs="+", choices=tuple(STAGES), default=tuple(STAGES))
+    parser.add_argument("--sizes", type=int, nargs="+", default=SIZES)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--min-time", type=float, default=0.2, help="seconds spent measuring each case")
+    parser.add_argument("--max-repeats", type=int, default=20)
+    parser.add_argument("--output", help="save the results to this JSON file")
+    parser.add_argument("--baseline", help="JSON results to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed relative slowdown")
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks(args.stages, sorted(args.sizes), args.seed, args.min_time, args.max_repeats)
+    exponents = {stage: scaling_exponent([r for r in results if r["stage"] == stage]) for stage in args.stages}
+    print("scaling exponents: " + ", ".join(f"{stage} {exponent:.2f}" for stage, exponent in exponents.items() if exponent is not None))
+
+    report = {
+        "machine": {"python": platform.python_version(), "numpy": np.__version__,
+                    "platform": platform.platform(), "cpus": os.cpu_count()},
+        "seed": args.seed,
+        "results": results,
+        "exponents": exponents,
+    }
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(report, file, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            regressions = compare(results, json.load(file), args.threshold)
+        for stage, n, before, after in regressions:
+            print(f"REGRESSION {stage} N={n}: {before * 1e3:.3f} ms -> {after * 1e3:.3f} ms (+{(after / before - 1) * 100:.0f}%)")
+        if regressions:
+            return 1
+        print(f"no regression above {args.threshold * 100:.0f}%")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
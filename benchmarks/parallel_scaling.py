@@ -0,0 +1,63 @@
+# Scaling of ParallelForceEngine with the number of worker processes
+#
+#     python benchmarks/parallel_scaling.py --bodies 20000 --workers 1 2 4 8
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from nbody.forces import VectorizedForceEngine
+from nbody.parallel import ParallelForceEngine
+
+G = 6.674e-11
+
+
+def best_time(engine, x, y, mass, repeats):
+    # The first call also starts the workers and allocates the shared memory
+    engine.compute_accelerations(x, y, mass, G)
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        engine.compute_accelerations(x, y, mass, G)
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main():
+    cores = os.cpu_count() or 1
+    default_workers = [1 << k for k in range(cores.bit_length()) if 1 << k <= cores]
+    parser = argparse.ArgumentParser(description="Scaling of ParallelForceEngine with the number of workers")
+    parser.add_argument("--bodies", type=int, default=20000)
+    parser.add_argument("--workers", type=int, nargs="+", default=default_workers)
+    parser.add_argument("--tile-size", type=int, default=2048)
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    x = rng.uniform(-1e14, 1e14, args.bodies)
+    y = rng.uniform(-1e14, 1e14, args.bodies)
+    mass = rng.uniform(1e20, 1e30, args.bodies)
+
+    serial = best_time(VectorizedForceEngine(), x, y, mass, args.repeats)
+    print(f"{args.bodies} bodies, {cores} cores")
+    print(f"{'serial (third law)':>20}: {serial:8.3f} s")
+
+    reference = None
+    for workers in args.workers:
+        engine = ParallelForceEngine(workers=workers, tile_size=args.tile_size)
+        try:
+            elapsed = best_time(engine, x, y, mass, args.repeats)
+        finally:
+            engine.close()
+        reference = reference or elapsed
+        print(f"{workers:>12} workers: {elapsed:8.3f} s, speedup {reference / elapsed:5.2f}x "
+              f"({serial / elapsed:5.2f}x the serial engine)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+"""Gravitational N-body simulation.
+
+Every name below is imported from its module on first access, so that
+`import nbody` does not load NumPy (nor pygame, which only the window
+needs): headless jobs only pay for the modules they use.
+"""
+import importlib
+
+_EXPORTS = {
+    "CelestialObject": "core",
+    "GravitationalSystem": "core",
+    "Simulation": "core",
+    "SystemGenerator": "core",
+    "BodyStore": "bodystore",
+    "ENGINES": "engines",
+    "make_force_engine": "engines",
+    "register_engine": "engines",
+    "INTEGRATORS": "integrators",
+    "make_integrator": "integrators",
+    "DISTRIBUTIONS": "initial_conditions",
+    "generate_bodies": "initial_conditions",
+    "load_preset": "presets",
+    "preset_names": "presets",
+    "solar_system": "presets",
+    "save_checkpoint": "checkpoint",
+    "load_checkpoint": "checkpoint",
+    "TrajectoryWriter": "trajectory",
+    "TrajectoryReader": "trajectory",
+    "Profiler": "profiling",
+    "Diagnostics": "diagnostics",
+    "DriftAlarm": "diagnostics",
+    "MainWindow": "window",
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module("." + _EXPORTS[name], __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_EXPORTS))
@@ -0,0 +1,8 @@
+# python -m nbody run ... / python -m nbody replay ...
+import sys
+
+from .cli import main
+
+# Guarded: the processes spawned by the parallel engine import this module again
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,250 @@
+# Structure-of-arrays storage for the celestial objects
+import math
+import numpy as np
+
+# Float fields stored for every body
+FIELDS = ("mass", "x", "y", "vx", "vy", "density", "real_radius", "display_radius")
+
+# RGB values of the color names used by the presets (same values as pygame)
+NAMED_COLORS = {
+    "yellow": (255, 255, 0),
+    "gray": (190, 190, 190),
+    "orange": (255, 165, 0),
+    "blue": (0, 0, 255),
+    "red": (255, 0, 0),
+    "gold": (255, 215, 0),
+    "lightblue": (173, 216, 230),
+    "brown": (165, 42, 42),
+    "white": (255, 255, 255),
+}
+
+
+def to_rgb(color):
+    """Convert a color name or an RGB(A) sequence to an (r, g, b) tuple."""
+    if isinstance(color, str):
+        if color in NAMED_COLORS:
+            return NAMED_COLORS[color]
+        # Other names are resolved by pygame, imported only when needed
+        import pygame
+        return tuple(pygame.Color(color))[:3]
+    return tuple(int(c) for c in color[:3])
+
+
+def real_radii(mass, density):
+    return ((3 * mass) / (4 * math.pi * density)) ** (1 / 3)
+
+
+def display_radii(real_radius):
+    # Same transformation as CelestialObject.calculate_display_radius
+    return np.log(real_radius) ** 5 // 100000
+
+
+def _field_property(name):
+    def getter(self):
+        return self._store._data[name][self._index]
+
+    def setter(self, value):
+        self._store._data[name][self._index] = value
+
+    return property(getter, setter)
+
+
+def _array_property(name):
+    def getter(self):
+        return self._data[name][:self.count]
+
+    def setter(self, value):
+        # Assign in place so that augmented assignments (store.x += ...) work on the view
+        self._data[name][:self.count] = value
+
+    return property(getter, setter)
+
+
+# Class to access one body of a BodyStore as if it was a CelestialObject
+class Body:
+    """Lightweight handle on the body at a given index of a store.
+
+    Handles are invalidated by BodyStore.delete, which compacts the arrays.
+    """
+
+    __slots__ = ("_store", "_index")
+
+    def __init__(self, store, index):
+        self._store = store
+        self._index = index
+
+    x = _field_property("x")
+    y = _field_property("y")
+    vx = _field_property("vx")
+    vy = _field_property("vy")
+    real_radius = _field_property("real_radius")
+    display_radius = _field_property("display_radius")
+
+    @property
+    def mass(self):
+        return self._store._data["mass"][self._index]
+
+    @mass.setter
+    def mass(self, value):
+        self._store._data["mass"][self._index] = value
+        self._store.update_radii([self._index])
+
+    @property
+    def density(self):
+        return self._store._data["density"][self._index]
+
+    @density.setter
+    def density(self, value):
+        self._store._data["density"][self._index] = value
+        self._store.update_radii([self._index])
+
+    @property
+    def color(self):
+        return tuple(self._store._color[self._index].tolist())
+
+    @color.setter
+    def color(self, value):
+        self._store._color[self._index] = to_rgb(value)
+
+    def calculate_real_radius(self):
+        return ((3 * self.mass) / (4 * math.pi * self.density))**(1/3)
+
+    def calculate_display_radius(self):
+        return math.log(self.real_radius)**5//100000
+
+    def update_position(self, time_step):
+        self.x += self.vx * time_step
+        self.y += self.vy * time_step
+
+    def __repr__(self):
+        return f"Body(index={self._index}, mass={self.mass}, x={self.x}, y={self.y}, vx={self.vx}, vy={self.vy})"
+
+
+# Class to store all the bodies of a system in contiguous typed arrays
+class BodyStore:
+    """Each field is a float64 array and colors are an (n, 3) uint8 array.
+
+    The arrays are over-allocated so that appending is amortized O(1). The
+    public attributes (x, y, mass, ...) are views on the first len(store)
+    elements: writing into them updates the store without any copy. version
+    changes every time bodies are appended or deleted.
+    """
+
+    def __init__(self, capacity=16):
+        capacity = max(capacity, 1)
+        self._data = {name: np.zeros(capacity) for name in FIELDS}
+        self._color = np.zeros((capacity, 3), dtype=np.uint8)
+        self.count = 0
+        self.version = 0
+
+    @classmethod
+    def from_objects(cls, objects):
+        objects = list(objects)
+        store = cls(len(objects))
+        store.append_arrays(
+            mass=[obj.mass for obj in objects],
+            x=[obj.x for obj in objects],
+            y=[obj.y for obj in objects],
+            vx=[obj.vx for obj in objects],
+            vy=[obj.vy for obj in objects],
+            density=[obj.density for obj in objects],
+            color=[to_rgb(obj.color) for obj in objects],
+        )
+        return store
+
+    @classmethod
+    def from_arrays(cls, fields, color):
+        """Store holding exactly the given arrays (radii included, nothing is recomputed)."""
+        n = len(color)
+        store = cls(n)
+        for name in FIELDS:
+            store._data[name][:n] = fields[name]
+        store._color[:n] = color
+        store.count = n
+        return store
+
+    def arrays(self):
+        """Views on all the float fields, by name."""
+        return {name: self._data[name][:self.count] for name in FIELDS}
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += self.count
+        if not 0 <= index < self.count:
+            raise IndexError("body index out of range")
+        return Body(self, index)
+
+    def __iter__(self):
+        for index in range(self.count):
+            yield Body(self, index)
+
+    @property
+    def capacity(self):
+        return len(self._color)
+
+    def _reserve(self, capacity):
+        if capacity <= self.capacity:
+            return
+        capacity = max(capacity, 2 * self.capacity)
+        for name in FIELDS:
+            data = np.zeros(capacity)
+            data[:self.count] = self._data[name][:self.count]
+            self._data[name] = data
+        color = np.zeros((capacity, 3), dtype=np.uint8)
+        color[:self.count] = self._color[:self.count]
+        self._color = color
+
+    def append_arrays(self, mass, x, y, vx, vy, density, color):
+        """Append a batch of bodies, the radii are computed from mass and density."""
+        mass = np.asarray(mass, dtype=float)
+        n = len(mass)
+        start = self.count
+        self._reserve(start + n)
+        end = start + n
+        self._data["mass"][start:end] = mass
+        self._data["x"][start:end] = x
+        self._data["y"][start:end] = y
+        self._data["vx"][start:end] = vx
+        self._data["vy"][start:end] = vy
+        self._data["density"][start:end] = density
+        self._color[start:end] = np.asarray(color, dtype=np.uint8).reshape(n, 3)
+        self.count = end
+        self.update_radii(slice(start, end))
+        self.version += 1
+
+    def append(self, obj):
+        self.append_arrays([obj.mass], [obj.x], [obj.y], [obj.vx], [obj.vy], [obj.density], [to_rgb(obj.color)])
+        return Body(self, self.count - 1)
+
+    def delete(self, indices):
+        """Remove the bodies at the given indices and compact the arrays in place."""
+        keep = np.ones(self.count, dtype=bool)
+        keep[indices] = False
+        remaining = int(keep.sum())
+        for name in FIELDS:
+            data = self._data[name]
+            data[:remaining] = data[:self.count][keep]
+        self._color[:remaining] = self._color[:self.count][keep]
+        self.count = remaining
+        self.version += 1
+
+    def update_radii(self, index):
+        real_radius = real_radii(self._data["mass"][index], self._data["density"][index])
+        self._data["real_radius"][index] = real_radius
+        self._data["display_radius"][index] = display_radii(real_radius)
+
+    mass = _array_property("mass")
+    x = _array_property("x")
+    y = _array_property("y")
+    vx = _array_property("vx")
+    vy = _array_property("vy")
+    density = _array_property("density")
+    real_radius = _array_property("real_radius")
+    display_radius = _array_property("display_radius")
+
+    @property
+    def color(self):
+        return self._color[:self.count]
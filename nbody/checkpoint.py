@@ -0,0 +1,144 @@
+# Checkpoint and restart of the full state of a Simulation
+#
+# A checkpoint file is:
+# - the magic bytes and the length of a JSON header (8 + 8 bytes),
+# - the JSON header: scalars of the simulation and of the integrator, the
+#   recipe of the initial conditions, the reference of the drifts, and the
+#   name, dtype, shape and offset of every array,
+# - the arrays, dumped in bulk, each aligned on 64 bytes.
+import json
+import os
+import struct
+
+import numpy as np
+
+from .bodystore import BodyStore
+from .integrators import make_integrator
+
+MAGIC = b"NBCHKPT1"
+PREFIX = struct.Struct("<8sQ")
+ALIGNMENT = 64
+
+
+def _split_state(state, prefix):
+    """Separate the numbers (JSON) from the arrays (binary) of an integrator state."""
+    scalars, arrays = {}, {}
+    for key, value in state.items():
+        if isinstance(value, np.ndarray):
+            arrays[prefix + key] = value
+        else:
+            scalars[key] = value.item() if isinstance(value, np.generic) else value
+    return scalars, arrays
+
+
+def save_checkpoint(path, simulation):
+    """Write the state of the simulation atomically.
+
+    The file is written next to its destination, synced to disk and then
+    renamed over it, so an interrupted write never damages the previous
+    checkpoint.
+    """
+    system = simulation.system
+    bodies = system.bodies
+    integrator_scalars, integrator_arrays = _split_state(simulation.integrator.get_state(system), "integrator.")
+    arrays = {"bodies." + name: array for name, array in bodies.arrays().items()}
+    arrays["bodies.color"] = bodies.color
+    arrays.update(integrator_arrays)
+    # A reference taken before the last merges is replaced at the next measurement anyway
+    reference = simulation.drift_reference
+    if reference is not None and reference["version"] != bodies.version:
+        reference = None
+
+    header = {
+        "time_step": simulation.time_step,
+        "elapsed_time": simulation.elapsed_time,
+        "step_count": simulation.step_count,
+        "G": system.G,
+        "force_evaluations": system.force_evaluations,
+        "force_engine": type(system.force_engine).__name__,
+        "integrator": simulation.integrator.name,
+        "integrator_state": integrator_scalars,
+        "initial_conditions": simulation.initial_conditions,
+        "drift_reference": reference,
+        "arrays": [],
+    }
+    offset = 0
+    for name, array in arrays.items():
+        header["arrays"].append({"name": name, "dtype": array.dtype.str, "shape": list(array.shape), "offset": offset})
+        offset += -(-array.nbytes // ALIGNMENT) * ALIGNMENT
+    encoded_header = json.dumps(header).encode()
+    start = -(-(PREFIX.size + len(encoded_header)) // ALIGNMENT) * ALIGNMENT
+
+    temporary_path = f"{path}.tmp{os.getpid()}"
+    with open(temporary_path, "wb") as file:
+        file.write(PREFIX.pack(MAGIC, len(encoded_header)))
+        file.write(encoded_header)
+        for description, array in zip(header["arrays"], arrays.values()):
+            file.seek(start + description["offset"])
+            file.write(np.ascontiguousarray(array).data)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(temporary_path, path)
+    # Make the rename itself durable
+    directory = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY)
+    try:
+        os.fsync(directory)
+    finally:
+        os.close(directory)
+
+
+def load_checkpoint(path, force_engine=None):
+    """Rebuild the Simulation saved in path, which then continues exactly as the original.
+
+    The force engine is not saved: pass the one the run used (the default
+    engine otherwise).
+    """
+    from .core import Simulation
+
+    with open(path, "rb") as file:
+        magic, header_size = PREFIX.unpack(file.read(PREFIX.size))
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a checkpoint file")
+        header = json.loads(file.read(header_size))
+    start = -(-(PREFIX.size + header_size) // ALIGNMENT) * ALIGNMENT
+    data = np.memmap(path, dtype=np.uint8, mode="r")
+    arrays = {}
+    for description in header["arrays"]:
+        dtype = np.dtype(description["dtype"])
+        count = int(np.prod(description["shape"]))
+        array = np.frombuffer(data, dtype=dtype, count=count, offset=start + description["offset"])
+        arrays[description["name"]] = array.reshape(description["shape"]).copy()
+    del data
+
+    fields = {name[len("bodies."):]: array for name, array in arrays.items() if name.startswith("bodies.")}
+    color = fields.pop("color")
+    bodies = BodyStore.from_arrays(fields, color)
+    integrator = make_integrator(header["integrator"])
+    simulation = Simulation(bodies, header["time_step"], force_engine, integrator)
+    simulation.system.G = header["G"]
+    simulation.system.force_evaluations = header["force_evaluations"]
+    simulation.elapsed_time = header["elapsed_time"]
+    simulation.step_count = header["step_count"]
+
+    state = dict(header["integrator_state"])
+    state.update({name[len("integrator."):]: array for name, array in arrays.items() if name.startswith("integrator.")})
+    integrator.set_state(state, simulation.system)
+
+    # Checkpoints written before the recipe was saved have none
+    simulation.initial_conditions = header.get("initial_conditions")
+    reference = header.get("drift_reference")
+    if reference is not None:
+        # The restarted run measures its drifts from the same reference
+        simulation.drift_reference = dict(reference, version=bodies.version)
+    return simulation
+
+
+# Class to save a checkpoint periodically, attached with simulation.add_observer(writer, every=K)
+class CheckpointWriter:
+    def __init__(self, path):
+        self.path = path
+        self.count = 0
+
+    def __call__(self, simulation):
+        save_checkpoint(self.path, simulation)
+        self.count += 1
@@ -0,0 +1,239 @@
+# Command line entry point: python -m nbody run --bodies N --steps K ...
+import argparse
+import sys
+import time
+
+from .core import Simulation, SystemGenerator
+from .engines import make_force_engine as make_engine
+from .integrators import INTEGRATORS, make_integrator
+from .trajectory import POSITION_FORMATS, TrajectoryWriter
+from .initial_conditions import DISTRIBUTIONS
+from .checkpoint import CheckpointWriter, load_checkpoint, save_checkpoint
+from .diagnostics import DRIFTS, Diagnostics, DriftAlarm, DriftError, open_diagnostics_writer
+from .presets import load_preset, preset_names, read_preset
+from .profiling import Profiler
+from .projections import VIEW_MODES
+
+DAY = 86400
+
+
+def make_force_engine(args):
+    # The module of the engine is imported here, only the chosen one
+    if args.engine == "barnes-hut":
+        return make_engine("barnes-hut", theta=args.theta)
+    if args.engine == "softened":
+        return make_engine("softened", softening=args.softening, kernel=args.softening_kernel, dtype=args.precision)
+    if args.engine in ("pm", "p3m"):
+        box = (-args.box_size / 2, -args.box_size / 2, args.box_size) if args.boundary == "periodic" else None
+        return make_engine(args.engine, grid_size=args.grid_size, boundary=args.boundary, box=box)
+    if args.engine == "parallel":
+        return make_engine("parallel", workers=args.workers, tile_size=args.tile_size)
+    return make_engine("direct")
+
+
+def make_system(args):
+    # The recipe of the bodies is returned too, for the checkpoints
+    if args.preset != "random":
+        return load_preset(args.preset), {"preset": args.preset}
+    generator = SystemGenerator(args.bodies, args.zero_speed, seed=args.seed, distribution=args.distribution)
+    return generator.generate_bodies(), generator.recipe()
+
+
+def drift_alarm(text):
+    # QUANTITY=THRESHOLD, checked by argparse
+    quantity, _, threshold = text.partition("=")
+    try:
+        threshold = float(threshold)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected QUANTITY=THRESHOLD, got {text!r}") from None
+    if quantity not in DRIFTS:
+        raise argparse.ArgumentTypeError(f"unknown drift {quantity!r}, choose from {', '.join(DRIFTS)}")
+    return quantity, threshold
+
+
+def make_diagnostics(args):
+    # Diagnostics are only computed when they are written, watched or drawn
+    if not (args.diagnostics or args.drift_alarm or args.sparkline):
+        return None
+    alarms = [DriftAlarm(quantity, threshold, args.on_drift) for quantity, threshold in args.drift_alarm]
+    writer = open_diagnostics_writer(args.diagnostics) if args.diagnostics else None
+    return Diagnostics(writer=writer, alarms=alarms)
+
+
+def run(args):
+    force_engine = make_force_engine(args)
+    try:
+        return simulate(args, force_engine)
+    finally:
+        # The parallel engine owns a pool of processes and shared memory
+        close = getattr(force_engine, "close", None)
+        if close is not None:
+            close()
+
+
+def simulate(args, force_engine):
+    if args.window:
+        # The window does not attach the observers of a headless run, nor export its trace
+        for option in ("restart", "record", "checkpoint", "trace"):
+            if getattr(args, option):
+                print(f"--{option} only works headless", file=sys.stderr)
+                return 2
+    profiler = Profiler(trace=args.trace is not None) if args.profile or args.trace or args.hud else None
+    if args.restart:
+        simulation = load_checkpoint(args.restart, force_engine)
+        if profiler is not None:
+            simulation.profiler = simulation.system.profiler = profiler
+    else:
+        system, initial_conditions = make_system(args)
+        integrator = make_integrator(args.integrator)
+    diagnostics = make_diagnostics(args)
+
+    if args.window:
+        # pygame is only imported here, when a window is requested
+        from .window import MainWindow
+        scale_factor = args.scale if args.scale else (read_preset(args.preset)["scale_factor"] if args.preset != "random" else 10e11)
+        main_window = MainWindow(800, 600, args.fps, "Gravitational trajectory simulator",
+                                 system, args.dt, scale_factor, force_engine, integrator,
+                                 steps_per_frame=None if args.free_run else args.steps_per_frame,
+                                 interpolate=not args.no_interpolation, splat_radius=args.splat_radius,
+                                 profiler=profiler, hud=args.hud, view=args.view,
+                                 diagnostics=diagnostics, diagnostics_every=args.diagnostics_every)
+        main_window.run()
+        return 0
+
+    if not args.restart:
+        simulation = Simulation(system, args.dt, force_engine, integrator, profiler)
+        simulation.initial_conditions = initial_conditions
+    # The diagnostics come first, so that a checkpoint of the same step holds their drift reference
+    if diagnostics is not None:
+        simulation.add_observer(diagnostics, args.diagnostics_every)
+    if args.checkpoint:
+        simulation.add_observer(CheckpointWriter(args.checkpoint), args.checkpoint_every)
+    recorder = None
+    if args.record:
+        recorder = TrajectoryWriter(args.record, args.record_format)
+        simulation.add_observer(recorder, args.record_every)
+    num_bodies = len(simulation.system.bodies)
+    force_evaluations = simulation.system.force_evaluations
+    first_step = simulation.step_count
+    status = 0
+    start = time.perf_counter()
+    try:
+        for _ in range(args.steps):
+            simulation.step()
+            if simulation.paused:
+                print(f"Paused by the drift alarm: {diagnostics.alarm}", file=sys.stderr)
+                if args.checkpoint:
+                    save_checkpoint(args.checkpoint, simulation)
+                    print(f"Continue with --restart {args.checkpoint}", file=sys.stderr)
+                status = 3
+                break
+    except DriftError as error:
+        print(f"Aborted by the drift alarm: {error}", file=sys.stderr)
+        status = 3
+    finally:
+        if recorder is not None:
+            recorder.close()
+        if diagnostics is not None:
+            diagnostics.close()
+    elapsed = time.perf_counter() - start
+    steps = simulation.step_count - first_step
+
+    steps_per_second = steps / elapsed if elapsed > 0 else float("inf")
+    print(f"{steps} steps of {simulation.time_step:g} s with {num_bodies} bodies "
+          f"({len(simulation.system.bodies)} after merges) in {elapsed:.3f} s: "
+          f"{steps_per_second:.2f} steps/s, {(simulation.system.force_evaluations - force_evaluations) / elapsed:.3g} force evaluations/s")
+    if diagnostics is not None and diagnostics.count:
+        latest = diagnostics.latest()
+        print(f"drift at step {int(latest['step'])}: energy {latest['energy_drift']:.3g}, momentum {latest['momentum_drift']:.3g}, "
+              f"angular momentum {latest['angular_momentum_drift']:.3g}, virial ratio {latest['virial_ratio']:.3f}")
+    if profiler is not None:
+        print("\n".join(profiler.report()))
+        if args.trace:
+            profiler.export_trace(args.trace)
+    return status
+
+
+def replay(args):
+    # Imported here: the replay window needs pygame
+    from .replay import ReplayWindow
+    replay_window = ReplayWindow(args.path, 800, 600, args.fps, args.scale, speed=args.speed, splat_radius=args.splat_radius)
+    replay_window.run()
+    return 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="nbody", description="Gravitational N-body simulator")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="run a simulation, headless unless --window is given")
+    run_parser.add_argument("--preset", choices=("random", *preset_names()), default="random")
+    run_parser.add_argument("--bodies", type=int, default=100, help="number of bodies of the random preset")
+    run_parser.add_argument("--seed", type=int, default=None, help="seed of the random preset")
+    run_parser.add_argument("--distribution", choices=tuple(DISTRIBUTIONS), default="uniform",
+                            help="initial conditions of the random preset")
+    run_parser.add_argument("--zero-speed", action="store_true", help="start the random bodies at rest (uniform distribution)")
+    run_parser.add_argument("--steps", type=int, default=1000, help="number of time steps (headless)")
+    run_parser.add_argument("--dt", type=float, default=100 * DAY, help="time step in seconds")
+    run_parser.add_argument("--integrator", choices=tuple(INTEGRATORS), default="euler")
+    run_parser.add_argument("--engine", choices=("direct", "softened", "barnes-hut", "parallel", "pm", "p3m"), default="direct")
+    run_parser.add_argument("--theta", type=float, default=0.5, help="Barnes-Hut opening angle, in [0, 1)")
+    run_parser.add_argument("--softening", type=float, default=0.0, help="softening length in meters (softened engine)")
+    run_parser.add_argument("--softening-kernel", choices=("plummer", "spline"), default="plummer")
+    run_parser.add_argument("--precision", choices=("float64", "float32"), default="float64",
+                            help="precision of the pair terms of the softened engine (sums stay float64)")
+    run_parser.add_argument("--grid-size", type=int, default=256, help="mesh cells per side of the pm engine, smallest mesh of the p3m engine")
+    run_parser.add_argument("--boundary", choices=("isolated", "periodic"), default="isolated",
+                            help="boundaries of the pm/p3m engines")
+    run_parser.add_argument("--box-size", type=float, default=1e15,
+                            help="side in meters of the periodic box, centred on the origin")
+    run_parser.add_argument("--workers", type=int, default=None, help="processes of the parallel engine (all cores by default)")
+    run_parser.add_argument("--tile-size", type=int, default=2048, help="target bodies per task of the parallel engine")
+    run_parser.add_argument("--record", metavar="PATH", help="write the trajectory to this file (headless)")
+    run_parser.add_argument("--record-every", type=int, default=1, help="steps between two recorded frames")
+    run_parser.add_argument("--record-format", choices=tuple(POSITION_FORMATS), default="float32",
+                            help="storage of the recorded positions (uint16/uint32 are quantized)")
+    run_parser.add_argument("--checkpoint", metavar="PATH", help="save the full state to this file periodically (headless)")
+    run_parser.add_argument("--checkpoint-every", type=int, default=100, help="steps between two checkpoints")
+    run_parser.add_argument("--restart", metavar="PATH", help="continue the run saved in this checkpoint (headless)")
+    run_parser.add_argument("--window", action="store_true", help="open a pygame window instead of running headless")
+    run_parser.add_argument("--fps", type=int, default=30)
+    run_parser.add_argument("--steps-per-frame", type=int, default=1, help="physics steps per frame in the window")
+    run_parser.add_argument("--free-run", action="store_true", help="run the physics as fast as possible in the window")
+    run_parser.add_argument("--no-interpolation", action="store_true", help="draw the latest snapshot without blending")
+    run_parser.add_argument("--splat-radius", type=float, default=1,
+                            help="bodies with a smaller display radius are drawn as single pixels")
+    run_parser.add_argument("--scale", type=float, default=None, help="meters per pixel of the window")
+    run_parser.add_argument("--view", choices=tuple(VIEW_MODES), default="linear",
+                            help="projection of the window (the V key cycles through them)")
+    run_parser.add_argument("--profile", action="store_true", help="time the phases of the steps and print their percentiles")
+    run_parser.add_argument("--trace", metavar="PATH", help="write a Chrome trace (JSON) of the phases (headless)")
+    run_parser.add_argument("--hud", action="store_true", help="overlay the phase timings in the window (F3 toggles it)")
+    run_parser.add_argument("--diagnostics", metavar="PATH",
+                            help="stream energy, momenta and virial ratio to a .csv file, or to a directory of .npy columns")
+    run_parser.add_argument("--diagnostics-every", type=int, default=10, help="steps between two diagnostics")
+    run_parser.add_argument("--drift-alarm", metavar="QUANTITY=THRESHOLD", type=drift_alarm, action="append", default=[],
+                            help=f"stop when the relative drift of {', '.join(DRIFTS)} exceeds THRESHOLD (repeatable)")
+    run_parser.add_argument("--on-drift", choices=("pause", "abort"), default="abort",
+                            help="pause: save the checkpoint and stop (the window stops stepping), abort: stop at once")
+    run_parser.add_argument("--sparkline", action="store_true", help="draw the energy drift in the window")
+    run_parser.set_defaults(func=run)
+
+    replay_parser = commands.add_parser("replay", help="play a recorded trajectory back in a window")
+    replay_parser.add_argument("path", help="trajectory file written with run --record")
+    replay_parser.add_argument("--speed", type=float, default=1.0, help="recorded frames per displayed frame")
+    replay_parser.add_argument("--fps", type=int, default=60)
+    replay_parser.add_argument("--scale", type=float, default=10e11, help="meters per pixel")
+    replay_parser.add_argument("--splat-radius", type=float, default=1,
+                               help="bodies with a smaller display radius are drawn as single pixels")
+    replay_parser.set_defaults(func=replay)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
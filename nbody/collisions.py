@@ -0,0 +1,144 @@
+# Broad-phase collision detection between spherical bodies
+import numpy as np
+
+
+def find_overlapping_pairs(x, y, radius, chunk_size=1 << 20):
+    """Return the index arrays (i, j), i < j, of all the bodies closer than the sum of their radii.
+
+    Sweep and prune: the bodies are sorted by the left edge of their bounding
+    box, so that the candidates of a body are the following bodies whose left
+    edge is before its right edge. Only those candidates are tested in y and
+    then with the exact distance, which is roughly linear for sparse systems.
+    """
+    n = len(x)
+    if n < 2:
+        return np.zeros(0, dtype=int), np.zeros(0, dtype=int)
+
+    left = x - radius
+    order = np.argsort(left, kind="stable")
+    sorted_left = left[order]
+    sorted_right = (x + radius)[order]
+    last = np.searchsorted(sorted_left, sorted_right, side="right")
+    counts = np.maximum(last - np.arange(n) - 1, 0)
+
+    found_i, found_j = [], []
+    cumulative = np.cumsum(counts)
+    first = 0
+    while first < n:
+        # Group the sweep positions so that each chunk expands to about chunk_size candidates
+        stop = int(np.searchsorted(cumulative, cumulative[first] - counts[first] + chunk_size, side="right"))
+        stop = min(max(stop, first + 1), n)
+        chunk_counts = counts[first:stop]
+        positions = np.arange(first, stop)
+        a = np.repeat(positions, chunk_counts)
+        b = a + 1 + (np.arange(chunk_counts.sum()) - np.repeat(np.cumsum(chunk_counts) - chunk_counts, chunk_counts))
+        i, j = order[a], order[b]
+
+        dy = y[j] - y[i]
+        reach = radius[i] + radius[j]
+        close = np.abs(dy) < reach
+        i, j, dy, reach = i[close], j[close], dy[close], reach[close]
+        dx = x[j] - x[i]
+        touching = dx * dx + dy * dy < reach * reach
+        found_i.append(i[touching])
+        found_j.append(j[touching])
+        first = stop
+
+    i = np.concatenate(found_i)
+    j = np.concatenate(found_j)
+    return np.minimum(i, j), np.maximum(i, j)
+
+
+def connected_components(n, i, j):
+    """Label each of the n bodies with the smallest index of the group of bodies it touches.
+
+    The pairs (i, j) are the edges of the graph. Labels are propagated along
+    the edges with pointer jumping until they are stable.
+    """
+    labels = np.arange(n)
+    while True:
+        lowest = np.minimum(labels[i], labels[j])
+        new_labels = labels.copy()
+        np.minimum.at(new_labels, i, lowest)
+        np.minimum.at(new_labels, j, lowest)
+        new_labels = new_labels[new_labels]
+        if np.array_equal(new_labels, labels):
+            return labels
+        labels = new_labels
+
+
+def find_close_pairs(x, y, cutoff, box=None, chunk_size=1 << 20):
+    """Return the index arrays (i, j), i != j, of all the pairs closer than cutoff, each pair once."""
+    found = list(iter_close_pairs(x, y, cutoff, box, chunk_size))
+    if not found:
+        return np.zeros(0, dtype=int), np.zeros(0, dtype=int)
+    return np.concatenate([i for i, _ in found]), np.concatenate([j for _, j in found])
+
+
+def iter_close_pairs(x, y, cutoff, box=None, chunk_size=1 << 20):
+    """Yield the pairs (i, j) closer than cutoff by batches of at most chunk_size candidates.
+
+    Cell list: the bodies are sorted by square cells of side cutoff, and each
+    body is tested against the bodies of its own cell (after it) and of four
+    neighbouring cells (half of the 3 x 3 stencil), so dense systems cost
+    O(N * neighbours). With box = (x0, y0, size), space is periodic and
+    distances are those of the nearest periodic images.
+    """
+    n = len(x)
+    if n < 2:
+        return
+    if box is None:
+        x0, y0 = x.min(), y.min()
+        cells_x = int((x.max() - x0) // cutoff) + 1
+        cells_y = int((y.max() - y0) // cutoff) + 1
+        size, cell_size = None, cutoff
+    else:
+        x0, y0, size = box
+        cells_x = cells_y = int(size // cutoff)
+        if cells_x < 3:
+            raise ValueError("the periodic box must be at least 3 cutoffs wide")
+        cell_size = size / cells_x
+        # Positions wrapped into the box (distances use the nearest images anyway)
+        x = x0 + (x - x0) % size
+        y = y0 + (y - y0) % size
+    cell_x = np.minimum(((x - x0) // cell_size).astype(np.int64), cells_x - 1)
+    cell_y = np.minimum(((y - y0) // cell_size).astype(np.int64), cells_y - 1)
+    key = cell_y * cells_x + cell_x
+    order = np.argsort(key, kind="stable")
+    sorted_key = key[order]
+    cell_start = np.searchsorted(sorted_key, np.arange(cells_x * cells_y))
+    cell_end = np.searchsorted(sorted_key, np.arange(cells_x * cells_y), side="right")
+    sorted_cell_x, sorted_cell_y = cell_x[order], cell_y[order]
+    # The candidates of a body are runs of neighbouring sorted indices: reading the sorted
+    # coordinates avoids two random gathers per candidate
+    sorted_x, sorted_y = x[order], y[order]
+
+    for offset_x, offset_y in ((0, 0), (1, 0), (-1, 1), (0, 1), (1, 1)):
+        neighbour_x = sorted_cell_x + offset_x
+        neighbour_y = sorted_cell_y + offset_y
+        if size is None:
+            valid = (neighbour_x >= 0) & (neighbour_x < cells_x) & (neighbour_y < cells_y)
+        else:
+            valid = np.ones(n, dtype=bool)
+            neighbour_x %= cells_x
+            neighbour_y %= cells_y
+        neighbour = np.where(valid, neighbour_y * cells_x + neighbour_x, 0)
+        # Within the own cell, only the bodies after the current one
+        start = np.arange(n) + 1 if offset_x == offset_y == 0 else cell_start[neighbour]
+        counts = np.where(valid, np.maximum(cell_end[neighbour] - start, 0), 0)
+        cumulative = np.cumsum(counts)
+        first = 0
+        while first < n:
+            stop = int(np.searchsorted(cumulative, cumulative[first] - counts[first] + chunk_size, side="right"))
+            stop = min(max(stop, first + 1), n)
+            chunk_counts = counts[first:stop]
+            a = np.repeat(np.arange(first, stop), chunk_counts)
+            b = np.repeat(start[first:stop] - np.cumsum(chunk_counts) + chunk_counts, chunk_counts) + np.arange(chunk_counts.sum())
+            dx = sorted_x[b] - sorted_x[a]
+            dy = sorted_y[b] - sorted_y[a]
+            if size is not None:
+                dx -= size * np.round(dx / size)
+                dy -= size * np.round(dy / size)
+            close = dx * dx + dy * dy < cutoff * cutoff
+            yield order[a[close]], order[b[close]]
+            first = stop
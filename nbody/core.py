@@ -0,0 +1,287 @@
+# Physics core: celestial objects, the gravitational system and the simulation loop
+import math
+import random
+import numpy as np
+from .forces import VectorizedForceEngine
+from .collisions import find_overlapping_pairs, connected_components
+from .bodystore import BodyStore
+from .integrators import SemiImplicitEuler
+from .diagnostics import DRIFTS, add_drifts, measure
+from .profiling import NULL_PROFILER
+from .initial_conditions import generate_bodies
+
+# Class to represent a celestial object
+class CelestialObject:
+    def __init__(self, mass, x, y, vx, vy, density, color):
+        self.mass = mass
+        self.x = x
+        self.y = y
+        self.vx = vx
+        self.vy = vy
+        self.density = density
+        self.real_radius = self.calculate_real_radius()
+        self.color = color
+        self.display_radius = self.calculate_display_radius()
+
+    def calculate_real_radius(self):
+        return ((3 * self.mass) / (4 * math.pi * self.density))**(1/3)
+
+    def calculate_display_radius(self):
+        # We simply apply a transformation that reduces the real radius to a reasonable display radius
+        return math.log(self.real_radius)**5//100000
+
+    def update_position(self, time_step):
+        self.x += self.vx * time_step
+        self.y += self.vy * time_step
+
+# Class to represent the gravitational system
+class GravitationalSystem:
+    def __init__(self, system, force_engine=None):
+        self.objects = system
+        self.G = 6.674 * (10 ** -11)
+        # The engine computes the accelerations of all the objects in one pass
+        self.force_engine = force_engine if force_engine is not None else VectorizedForceEngine()
+        # Number of body accelerations computed so far (N per full evaluation)
+        self.force_evaluations = 0
+        self.profiler = NULL_PROFILER
+        # Accelerations computed with the last potential, see compute_potential
+        self._field = None
+
+    def calculate_gravitational_force(self, obj1, obj2):
+        dx = obj2.x - obj1.x
+        dy = obj2.y - obj1.y
+        distance = math.sqrt(dx**2 + dy**2)
+        force_magnitude = (self.G * obj1.mass * obj2.mass) / distance**2
+        angle = math.atan2(dy, dx)
+        force_x = force_magnitude * math.cos(angle)
+        force_y = force_magnitude * math.sin(angle)
+        return force_x, force_y
+
+    # The objects are kept in a BodyStore, a list of CelestialObject is converted on assignment
+    @property
+    def objects(self):
+        return self.bodies
+
+    @objects.setter
+    def objects(self, system):
+        self.bodies = system if isinstance(system, BodyStore) else BodyStore.from_objects(system)
+
+    def compute_accelerations(self, x=None, y=None):
+        # Accelerations at the current positions, or at trial positions used by the integrators
+        bodies = self.bodies
+        x = bodies.x if x is None else x
+        y = bodies.y if y is None else y
+        if self._field is not None:
+            version, field_x, field_y, ax, ay = self._field
+            self._field = None
+            if version == bodies.version and np.array_equal(x, field_x) and np.array_equal(y, field_y):
+                return ax, ay
+        self.force_evaluations += len(bodies)
+        with self.profiler.phase("forces"):
+            return self.force_engine.compute_accelerations(x, y, bodies.mass, self.G)
+
+    def compute_potential(self):
+        """Potential of every body at the current positions, computed by the force engine with the accelerations.
+
+        The accelerations are kept for the next compute_accelerations() call,
+        which reuses them if the bodies have not moved in between (the next
+        step of the semi-implicit Euler scheme), so the potential is free.
+        """
+        bodies = self.bodies
+        self.force_evaluations += len(bodies)
+        with self.profiler.phase("forces"):
+            ax, ay, potential = self.force_engine.compute_accelerations(bodies.x, bodies.y, bodies.mass, self.G, potential=True)
+        self._field = bodies.version, bodies.x.copy(), bodies.y.copy(), ax, ay
+        return potential
+
+    def update_velocities(self, time_step):
+        acceleration_x, acceleration_y = self.compute_accelerations()
+        self.bodies.vx += acceleration_x * time_step
+        self.bodies.vy += acceleration_y * time_step
+
+# # Class to manage the simulation
+# class Simulation:
+#     def __init__(self, system, time_step):
+#         self.system = GravitationalSystem(system)
+#         self.time_step = time_step
+
+#     def update_objects_positions(self):
+#         for obj in self.system.objects:
+#             obj.update_position(self.time_step)
+
+# Class to manage the simulation
+class Simulation:
+    def __init__(self, system, time_step, force_engine=None, integrator=None, profiler=None):
+        self.system = GravitationalSystem(system, force_engine)
+        self.time_step = time_step
+        # Semi-implicit Euler is the original scheme: update_velocities then update_objects_positions
+        self.integrator = integrator if integrator is not None else SemiImplicitEuler()
+        self.elapsed_time = 0.0
+        self.step_count = 0
+        # Where the bodies came from (SystemGenerator.recipe() or a preset name), saved in checkpoints
+        self.initial_conditions = None
+        # Conserved quantities the drifts are measured from (see diagnostics.add_drifts), saved in checkpoints
+        self.drift_reference = None
+        # Set by a drift alarm (see diagnostics.py): the loops driving the simulation stop stepping
+        self.paused = False
+        # Callbacks called with the simulation every few steps (recorders, checkpoints, ...)
+        self.observers = []
+        # Timers of the phases of a step, see profiling.py
+        self.profiler = self.system.profiler = profiler if profiler is not None else NULL_PROFILER
+
+    def add_observer(self, observer, every=1):
+        self.observers.append((observer, every))
+
+    def step(self):
+        profiler = self.profiler
+        with profiler.phase("integrate"):
+            self.integrator.step(self.system, self.time_step)
+        with profiler.phase("collisions"):
+            self.resolve_collisions()
+        self.elapsed_time += self.time_step
+        self.step_count += 1
+        if self.observers:
+            with profiler.phase("observers"):
+                for observer, every in self.observers:
+                    if self.step_count % every == 0:
+                        observer(self)
+        if profiler.enabled:
+            profiler.set("force evaluations", self.system.force_evaluations)
+
+    def conservation_drift(self):
+        # Relative drifts of energy, momentum and angular momentum, one force evaluation
+        row = add_drifts(self, measure(self.system))
+        return {quantity: row[column] for quantity, column in DRIFTS.items()}
+
+    def update_objects_positions(self):
+        bodies = self.system.bodies
+        bodies.x += bodies.vx * self.time_step
+        bodies.y += bodies.vy * self.time_step
+        self.resolve_collisions()
+
+    def resolve_collisions(self):
+        bodies = self.system.bodies
+        n = len(bodies)
+        if n < 2:
+            return
+        i, j = find_overlapping_pairs(bodies.x, bodies.y, bodies.real_radius)
+        if len(i) == 0:
+            return
+
+        # Every group of touching objects merges into the object with the lowest index of the group
+        labels = connected_components(n, i, j)
+        absorbed = np.flatnonzero(labels != np.arange(n))
+        merging = np.union1d(labels[absorbed], absorbed)
+        group = labels[merging]
+
+        # Same rules as merge_objects: mass, momentum and volume are conserved,
+        # position and color are those of the most massive object
+        mass = bodies.mass[merging]
+        new_mass = np.bincount(group, mass, minlength=n)
+        new_vx = np.bincount(group, mass * bodies.vx[merging], minlength=n)
+        new_vy = np.bincount(group, mass * bodies.vy[merging], minlength=n)
+        new_volume = np.bincount(group, bodies.real_radius[merging] ** 3, minlength=n)
+        order = np.lexsort((-mass, group))
+        sorted_group = group[order]
+        first_of_group = np.r_[True, sorted_group[1:] != sorted_group[:-1]]
+        heaviest = merging[order][first_of_group]
+        target = sorted_group[first_of_group]
+
+        bodies.vx[target] = new_vx[target] / new_mass[target]
+        bodies.vy[target] = new_vy[target] / new_mass[target]
+        bodies.x[target] = bodies.x[heaviest]
+        bodies.y[target] = bodies.y[heaviest]
+        bodies.color[target] = bodies.color[heaviest]
+        bodies.mass[target] = new_mass[target]
+        bodies.density[target] = (3 * new_mass[target]) / (4 * math.pi * new_volume[target])
+        bodies.update_radii(target)
+        bodies.delete(absorbed)
+        self.profiler.add("merges", len(absorbed))
+
+    def merge_objects(self, obj1, obj2):
+        # Calculate the new mass and velocity after merging
+        new_mass = obj1.mass + obj2.mass
+        new_velocity_x = (obj1.mass * obj1.vx + obj2.mass * obj2.vx) / new_mass
+        new_velocity_y = (obj1.mass * obj1.vy + obj2.mass * obj2.vy) / new_mass
+
+        # Choose the position of the more massive object
+        if obj1.mass >= obj2.mass:
+            new_x, new_y = obj1.x, obj1.y
+        else:
+            new_x, new_y = obj2.x, obj2.y
+
+        # The merged object keeps the total volume, its density follows from the merged mass
+        new_radius = (obj1.real_radius**3 + obj2.real_radius**3)**(1/3)
+        new_density = (3 * new_mass) / (4 * math.pi * new_radius**3)
+
+        # Use the color of the more massive object
+        new_color = obj1.color if obj1.mass >= obj2.mass else obj2.color
+
+        # Create a new CelestialObject with the merged properties
+        merged_obj = CelestialObject(new_mass, new_x, new_y, new_velocity_x, new_velocity_y, new_density, new_color)
+
+        return merged_obj
+
+
+# Class to generate a system of N bodies randomly
+class SystemGenerator:
+    """generate_system() builds CelestialObjects one by one (uniform box only).
+    generate_bodies() draws all the fields in vectorized blocks directly into
+    a BodyStore, from any distribution of initial_conditions.DISTRIBUTIONS.
+    """
+
+    def __init__(self, num_bodies, zero_speed_initialization, seed=None, distribution="uniform", **parameters):
+        self.num_bodies = num_bodies
+        self.zero_speed_initialization = zero_speed_initialization
+        # Without a seed, one is drawn here, so that recipe() rebuilds the same system as generate_system()
+        if seed is None:
+            seed = int(np.random.SeedSequence().entropy % 2**63)
+        self.seed = seed
+        # Private random generator, so that a seed gives the same system every time
+        self.random = random.Random(seed)
+        self.distribution = distribution
+        self.parameters = parameters
+
+    def generate_system(self):
+        system = []
+        min_mass, max_mass = 1e20, 1e30
+        min_position, max_position = -1e14, 1e14
+        min_density, max_density = 500,10000
+        if self.zero_speed_initialization:
+            min_velocity, max_velocity = 0, 0
+        else:
+            min_velocity, max_velocity = -1e3, 1e3
+
+        random = self.random
+        for _ in range(self.num_bodies):
+            mass = random.uniform(min_mass, max_mass)
+            x = random.uniform(min_position, max_position)
+            y = random.uniform(min_position, max_position)
+            vx = random.uniform(min_velocity, max_velocity)
+            vy = random.uniform(min_velocity, max_velocity)
+            density = random.uniform(min_density, max_density)
+            color = (random.randint(0, 255), random.randint(0, 255), random.randint(0, 255))
+
+            system.append(CelestialObject(mass, x, y, vx, vy, density, color))
+        return system
+
+    def recipe(self):
+        """Everything generate_bodies() depends on, as JSON-friendly values: from_recipe() rebuilds the generator."""
+        return {
+            "num_bodies": self.num_bodies,
+            "zero_speed_initialization": self.zero_speed_initialization,
+            "seed": self.seed,
+            "distribution": self.distribution,
+            "parameters": self.parameters,
+        }
+
+    @classmethod
+    def from_recipe(cls, recipe):
+        return cls(recipe["num_bodies"], recipe["zero_speed_initialization"], recipe["seed"],
+                   recipe["distribution"], **recipe["parameters"])
+
+    def generate_bodies(self):
+        parameters = dict(self.parameters)
+        if self.distribution == "uniform":
+            parameters.setdefault("zero_speed", self.zero_speed_initialization)
+        return generate_bodies(self.distribution, self.num_bodies, self.seed, **parameters)
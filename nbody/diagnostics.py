@@ -0,0 +1,225 @@
+# Conserved quantities of a running Simulation: ring buffer, CSV/columnar files and drift alarms
+import os
+import threading
+
+import numpy as np
+
+# Columns of a diagnostics row, in this order
+FIELDS = (
+    "step", "time", "kinetic_energy", "potential_energy", "energy",
+    "momentum_x", "momentum_y", "angular_momentum", "virial_ratio",
+    "energy_drift", "momentum_drift", "angular_momentum_drift",
+)
+
+# Quantities a DriftAlarm can watch, with the column holding their relative drift
+DRIFTS = {
+    "energy": "energy_drift",
+    "momentum": "momentum_drift",
+    "angular-momentum": "angular_momentum_drift",
+}
+
+ACTIONS = ("pause", "abort")
+
+
+# Exception raised by an alarm whose action is "abort"
+class DriftError(RuntimeError):
+    pass
+
+
+# Class to watch the relative drift of a conserved quantity
+class DriftAlarm:
+    """Goes off when the drift of quantity exceeds threshold, or is not finite.
+
+    action "pause" sets simulation.paused (the headless run stops and saves
+    its checkpoint, the window stops stepping until P is pressed), action
+    "abort" raises DriftError from the step.
+    """
+
+    def __init__(self, quantity, threshold, action="abort"):
+        if quantity not in DRIFTS:
+            raise ValueError(f"Unknown drift {quantity!r}, choose from {', '.join(DRIFTS)}")
+        if action not in ACTIONS:
+            raise ValueError(f"Unknown alarm action {action!r}, choose from {', '.join(ACTIONS)}")
+        self.quantity = quantity
+        self.threshold = threshold
+        self.action = action
+
+    def check(self, row):
+        """Message describing the alarm if it goes off for this row, None otherwise."""
+        drift = row[DRIFTS[self.quantity]]
+        if drift <= self.threshold:
+            return None
+        return f"{self.quantity} drift {drift:.3g} > {self.threshold:g} at step {int(row['step'])}"
+
+
+def measure(system):
+    """Energies, momenta and virial ratio of a GravitationalSystem.
+
+    The potential comes from the force engine (potential=True), at the cost
+    of one force evaluation, which the next step at the same positions
+    reuses. The angular momentum is taken about the origin, and the virial
+    ratio 2 K / |W| is 1 for a system in equilibrium.
+    """
+    bodies = system.bodies
+    mass, x, y, vx, vy = bodies.mass, bodies.x, bodies.y, bodies.vx, bodies.vy
+    kinetic = 0.5 * float(mass @ (vx * vx + vy * vy))
+    potential = 0.5 * float(mass @ system.compute_potential()) if len(bodies) else 0.0
+    return {
+        "kinetic_energy": kinetic,
+        "potential_energy": potential,
+        "energy": kinetic + potential,
+        "momentum_x": float(mass @ vx),
+        "momentum_y": float(mass @ vy),
+        "angular_momentum": float(mass @ (x * vy - y * vx)),
+        "virial_ratio": 2 * kinetic / abs(potential) if potential else 0.0,
+    }
+
+
+def add_drifts(simulation, row):
+    """Add the relative drifts to a row of measure(simulation.system) and return it.
+
+    Drifts are relative to simulation.drift_reference, taken from the row if
+    there is none: |E - E0| / |E0| for the energy, and the change of the
+    momenta divided by sum(m |v|) and sum(m |x v|) of the reference, since
+    the totals are often close to zero. Merges dissipate energy: the
+    reference is taken again whenever bodies are added or removed.
+    """
+    bodies = simulation.system.bodies
+    reference = simulation.drift_reference
+    if reference is None or reference["version"] != bodies.version:
+        reference = simulation.drift_reference = {
+            "version": bodies.version,
+            "energy": row["energy"],
+            "momentum": [row["momentum_x"], row["momentum_y"]],
+            "angular_momentum": row["angular_momentum"],
+            "momentum_scale": float(bodies.mass @ np.hypot(bodies.vx, bodies.vy)),
+            "angular_momentum_scale": float(bodies.mass @ np.abs(bodies.x * bodies.vy - bodies.y * bodies.vx)),
+        }
+    px0, py0 = reference["momentum"]
+    row["energy_drift"] = abs(row["energy"] - reference["energy"]) / abs(reference["energy"]) if reference["energy"] else 0.0
+    row["momentum_drift"] = (float(np.hypot(row["momentum_x"] - px0, row["momentum_y"] - py0)) / reference["momentum_scale"]
+                             if reference["momentum_scale"] else 0.0)
+    row["angular_momentum_drift"] = (abs(row["angular_momentum"] - reference["angular_momentum"]) / reference["angular_momentum_scale"]
+                                     if reference["angular_momentum_scale"] else 0.0)
+    return row
+
+
+# Class to record the diagnostics every few steps, attached with simulation.add_observer(diagnostics, every=K)
+class Diagnostics:
+    """The last capacity rows are kept in a ring buffer, which the window
+    reads from another thread, and every row is also passed to writer if
+    one is given. The drifts are computed by add_drifts, from the reference
+    of the simulation, which checkpoints save.
+    """
+
+    def __init__(self, capacity=1024, writer=None, alarms=()):
+        self.capacity = capacity
+        self.writer = writer
+        self.alarms = list(alarms)
+        self.count = 0
+        # Message of the last alarm that went off
+        self.alarm = None
+        self._buffer = np.full((capacity, len(FIELDS)), np.nan)
+        self._lock = threading.Lock()
+
+    def __call__(self, simulation):
+        self.record(simulation)
+
+    def record(self, simulation):
+        row = add_drifts(simulation, measure(simulation.system))
+        row["step"] = simulation.step_count
+        row["time"] = simulation.elapsed_time
+
+        with self._lock:
+            self._buffer[self.count % self.capacity] = [row[name] for name in FIELDS]
+            self.count += 1
+        if self.writer is not None:
+            self.writer.write(row)
+
+        for alarm in self.alarms:
+            message = alarm.check(row)
+            if message is None:
+                continue
+            self.alarm = message
+            if alarm.action == "abort":
+                raise DriftError(message)
+            simulation.paused = True
+        return row
+
+    def reset_reference(self, simulation):
+        """Measure the drifts from the next row on (after resuming a paused run, for example)."""
+        simulation.drift_reference = None
+
+    def history(self, name=None):
+        """Rows still in the buffer, oldest first: an array of one column, or a dict of all of them."""
+        with self._lock:
+            start = max(self.count - self.capacity, 0)
+            rows = self._buffer[np.arange(start, self.count) % self.capacity]
+        if name is not None:
+            return rows[:, FIELDS.index(name)]
+        return {field: rows[:, column] for column, field in enumerate(FIELDS)}
+
+    def latest(self):
+        """Last row as a dict, or None before the first one."""
+        if self.count == 0:
+            return None
+        return {name: float(column[-1]) for name, column in self.history().items()}
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+
+
+# Class to stream the diagnostics to a CSV file, one line per row
+class CsvDiagnosticsWriter:
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, "w")
+        self._file.write(",".join(FIELDS) + "\n")
+
+    def write(self, row):
+        self._file.write(",".join(repr(float(row[name])) for name in FIELDS) + "\n")
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+# Class to stream the diagnostics to a directory holding one .npy file per column
+class ColumnDiagnosticsWriter:
+    """Each column is a float64 .npy file, appended in place: its header is
+    rewritten after every row (NumPy pads it so that the length fits), so
+    np.load reads the complete rows at any time, also during the run.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self.count = 0
+        self._files = {name: open(os.path.join(directory, name + ".npy"), "wb") for name in FIELDS}
+        for file in self._files.values():
+            self._write_header(file)
+
+    def _write_header(self, file):
+        file.seek(0)
+        np.lib.format.write_array_header_1_0(file, {"descr": "<f8", "fortran_order": False, "shape": (self.count,)})
+
+    def write(self, row):
+        for name, file in self._files.items():
+            file.seek(0, os.SEEK_END)
+            file.write(np.float64(row[name]).tobytes())
+        self.count += 1
+        for file in self._files.values():
+            self._write_header(file)
+            file.flush()
+
+    def close(self):
+        for file in self._files.values():
+            file.close()
+
+
+def open_diagnostics_writer(path):
+    """CSV writer for a path ending in .csv, one .npy file per column in the directory path otherwise."""
+    if path.endswith(".csv"):
+        return CsvDiagnosticsWriter(path)
+    return ColumnDiagnosticsWriter(path)
@@ -0,0 +1,26 @@
+# Registry of the force engines, whose modules are imported only when an engine is created
+import importlib
+
+# Engine name: (module, class name, default options). Modules starting with a
+# dot are modules of this package, the others can be any importable module
+# (an optional accelerator, for example).
+ENGINES = {
+    "direct": (".forces", "VectorizedForceEngine", {}),
+    "softened": (".forces", "SoftenedForceEngine", {}),
+    "barnes-hut": (".barnes_hut", "BarnesHutEngine", {}),
+    "parallel": (".parallel", "ParallelForceEngine", {}),
+    "pm": (".particle_mesh", "ParticleMeshEngine", {}),
+    "p3m": (".particle_mesh", "ParticleMeshEngine", {"p3m": True}),
+}
+
+
+def register_engine(name, module, class_name, **defaults):
+    ENGINES[name] = (module, class_name, defaults)
+
+
+def make_force_engine(name, **options):
+    if name not in ENGINES:
+        raise ValueError(f"Unknown force engine {name!r}, choose from {', '.join(ENGINES)}")
+    module, class_name, defaults = ENGINES[name]
+    engine_class = getattr(importlib.import_module(module, __package__), class_name)
+    return engine_class(**{**defaults, **options})
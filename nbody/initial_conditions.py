@@ -0,0 +1,140 @@
+# Seeded, vectorized initial conditions written directly into a BodyStore
+#
+# Bodies are generated by blocks of BLOCK_SIZE: block k draws all its fields
+# at once from its own random generator, seeded with [seed, k]. Body i only
+# depends on the seed, on n and on its block, so the bodies are the same
+# however the generation is split into chunks (or spread over processes).
+import math
+
+import numpy as np
+
+from .bodystore import BodyStore
+
+BLOCK_SIZE = 1 << 16
+# Same constant as GravitationalSystem.G
+G = 6.674 * (10 ** -11)
+
+
+def _colors(rng, count):
+    return rng.integers(0, 256, size=(count, 3), dtype=np.uint8)
+
+
+def _polar(radius, angle):
+    return radius * np.cos(angle), radius * np.sin(angle)
+
+
+def _uniform(rng, count, n, zero_speed=False, min_mass=1e20, max_mass=1e30, extent=1e14,
+             max_velocity=1e3, min_density=500, max_density=10000):
+    # The box of the original SystemGenerator
+    max_velocity = 0.0 if zero_speed else max_velocity
+    return {
+        "mass": rng.uniform(min_mass, max_mass, count),
+        "x": rng.uniform(-extent, extent, count),
+        "y": rng.uniform(-extent, extent, count),
+        "vx": rng.uniform(-max_velocity, max_velocity, count),
+        "vy": rng.uniform(-max_velocity, max_velocity, count),
+        "density": rng.uniform(min_density, max_density, count),
+        "color": _colors(rng, count),
+    }
+
+
+def _plummer(rng, count, n, total_mass=1e32, scale_radius=1e13, density=5000, cutoff=10.0):
+    """Plummer sphere: the radial profile and the speeds of the 3D model
+    (Aarseth, Henon and Wielen 1974), laid in the plane with isotropic
+    directions. 2D forces differ from 3D ones, so it is close to, but not
+    exactly in, equilibrium.
+    """
+    radius = np.empty(count)
+    missing = np.arange(count)
+    # The radius of the enclosed mass fraction m is a / sqrt(m^(-2/3) - 1), truncated at cutoff * a
+    while len(missing):
+        fraction = rng.uniform(0.0, 1.0, len(missing))
+        with np.errstate(divide="ignore"):
+            r = scale_radius / np.sqrt(fraction ** (-2 / 3) - 1)
+        radius[missing] = r
+        missing = missing[~(r <= cutoff * scale_radius)]
+
+    # Speed q * escape speed, with q drawn from g(q) = q^2 (1 - q^2)^(7/2) by rejection (max of g < 0.1)
+    q = np.empty(count)
+    missing = np.arange(count)
+    while len(missing):
+        trial = rng.uniform(0.0, 1.0, len(missing))
+        accepted = rng.uniform(0.0, 0.1, len(missing)) < trial ** 2 * (1 - trial ** 2) ** 3.5
+        q[missing[accepted]] = trial[accepted]
+        missing = missing[~accepted]
+    speed = q * np.sqrt(2 * G * total_mass / np.sqrt(radius ** 2 + scale_radius ** 2))
+
+    x, y = _polar(radius, rng.uniform(0.0, 2 * math.pi, count))
+    vx, vy = _polar(speed, rng.uniform(0.0, 2 * math.pi, count))
+    return {
+        "mass": np.full(count, total_mass / n), "x": x, "y": y, "vx": vx, "vy": vy,
+        "density": np.full(count, float(density)), "color": _colors(rng, count),
+    }
+
+
+def _exponential_disk(rng, count, n, total_mass=1e32, scale_length=1e13, density=5000, dispersion=0.0):
+    """Exponential disk, surface density proportional to exp(-R / scale_length),
+    rotating counterclockwise at the circular velocity of the mass inside R
+    (monopole approximation), plus a Gaussian dispersion given as a fraction
+    of the circular velocity.
+    """
+    # R exp(-R / h) is the density of a Gamma(2, h) variable
+    radius = rng.gamma(2.0, scale_length, count)
+    angle = rng.uniform(0.0, 2 * math.pi, count)
+    x, y = _polar(radius, angle)
+    enclosed = total_mass * (1 - (1 + radius / scale_length) * np.exp(-radius / scale_length))
+    circular = np.sqrt(G * enclosed / radius)
+    vx, vy = -circular * np.sin(angle), circular * np.cos(angle)
+    if dispersion:
+        vx = vx + rng.normal(0.0, 1.0, count) * dispersion * circular
+        vy = vy + rng.normal(0.0, 1.0, count) * dispersion * circular
+    return {
+        "mass": np.full(count, total_mass / n), "x": x, "y": y, "vx": vx, "vy": vy,
+        "density": np.full(count, float(density)), "color": _colors(rng, count),
+    }
+
+
+def _cold_collapse(rng, count, n, total_mass=1e32, radius=1e13, density=5000):
+    """Uniform disk of bodies at rest, which collapses on itself."""
+    x, y = _polar(radius * np.sqrt(rng.uniform(0.0, 1.0, count)), rng.uniform(0.0, 2 * math.pi, count))
+    return {
+        "mass": np.full(count, total_mass / n), "x": x, "y": y, "vx": np.zeros(count), "vy": np.zeros(count),
+        "density": np.full(count, float(density)), "color": _colors(rng, count),
+    }
+
+
+DISTRIBUTIONS = {
+    "uniform": _uniform,
+    "plummer": _plummer,
+    "disk": _exponential_disk,
+    "cold-collapse": _cold_collapse,
+}
+
+
+def generate_block(distribution, n, seed, k, **parameters):
+    """Fields of the bodies of block k (bodies k * BLOCK_SIZE to (k + 1) * BLOCK_SIZE) of a system of n bodies."""
+    if distribution not in DISTRIBUTIONS:
+        raise ValueError(f"Unknown distribution {distribution!r}, choose from {', '.join(DISTRIBUTIONS)}")
+    count = min(BLOCK_SIZE, n - k * BLOCK_SIZE)
+    rng = np.random.default_rng([seed, k])
+    return DISTRIBUTIONS[distribution](rng, count, n, **parameters)
+
+
+def generate_range(distribution, n, seed, start, stop, **parameters):
+    """Fields of the bodies start to stop of a system of n bodies, the same whatever the split."""
+    blocks = [generate_block(distribution, n, seed, k, **parameters)
+              for k in range(start // BLOCK_SIZE, -(-stop // BLOCK_SIZE))]
+    offset = start - start // BLOCK_SIZE * BLOCK_SIZE
+    return {name: np.concatenate([block[name] for block in blocks])[offset:offset + stop - start] for name in blocks[0]}
+
+
+def generate_bodies(distribution, n, seed=0, chunk_size=BLOCK_SIZE * 16, store=None, **parameters):
+    """Append n bodies drawn from the distribution to store (a new BodyStore by default), chunk by chunk."""
+    if store is None:
+        store = BodyStore(n)
+    else:
+        store._reserve(len(store) + n)
+    for start in range(0, n, chunk_size):
+        fields = generate_range(distribution, n, seed, start, min(start + chunk_size, n), **parameters)
+        store.append_arrays(**fields)
+    return store
@@ -0,0 +1,344 @@
+# Time integration schemes used by Simulation to advance a GravitationalSystem
+import numpy as np
+
+from .forces import VectorizedForceEngine
+
+
+# Base class of the integrators
+class Integrator:
+    """An integrator advances the positions and velocities of a system by one time step.
+
+    The drifts of the conserved quantities are measured by
+    Simulation.conservation_drift() and the Diagnostics of diagnostics.py.
+    """
+
+    name = None
+
+    def step(self, system, time_step):
+        self.advance(system, time_step)
+
+    def advance(self, system, time_step):
+        raise NotImplementedError
+
+    def get_state(self, system):
+        """Parameters and internal state needed to continue the run exactly (numbers or arrays)."""
+        return {}
+
+    def set_state(self, state, system):
+        pass
+
+
+# Class for the original scheme: velocities first, then positions with the new velocities
+class SemiImplicitEuler(Integrator):
+    name = "euler"
+
+    def advance(self, system, time_step):
+        bodies = system.bodies
+        system.update_velocities(time_step)
+        bodies.x += bodies.vx * time_step
+        bodies.y += bodies.vy * time_step
+
+
+# Class for the kick-drift-kick leapfrog (velocity Verlet), second order and symplectic
+class Leapfrog(Integrator):
+    """The acceleration at the end of a step is reused at the start of the next one,
+    so each step costs a single force evaluation.
+    """
+
+    name = "leapfrog"
+
+    def __init__(self):
+        self._acceleration = None
+        self._version = None
+
+    def advance(self, system, time_step):
+        bodies = system.bodies
+        if self._acceleration is None or self._version != bodies.version:
+            self._acceleration = system.compute_accelerations()
+        ax, ay = self._acceleration
+        half_step = 0.5 * time_step
+
+        bodies.vx += ax * half_step
+        bodies.vy += ay * half_step
+        bodies.x += bodies.vx * time_step
+        bodies.y += bodies.vy * time_step
+        ax, ay = system.compute_accelerations()
+        bodies.vx += ax * half_step
+        bodies.vy += ay * half_step
+
+        self._acceleration = ax, ay
+        self._version = bodies.version
+
+    def get_state(self, system):
+        # The cached acceleration is only worth saving if it matches the current bodies
+        if self._acceleration is None or self._version != system.bodies.version:
+            return {}
+        return {"ax": self._acceleration[0], "ay": self._acceleration[1]}
+
+    def set_state(self, state, system):
+        if "ax" in state:
+            self._acceleration = state["ax"], state["ay"]
+            self._version = system.bodies.version
+
+
+# Class for the fourth order symplectic scheme of Yoshida (1990), three leapfrog steps
+class Yoshida4(Integrator):
+    name = "yoshida4"
+
+    W1 = 1 / (2 - 2 ** (1 / 3))
+    W0 = -2 ** (1 / 3) / (2 - 2 ** (1 / 3))
+    DRIFTS = (W1 / 2, (W0 + W1) / 2, (W0 + W1) / 2, W1 / 2)
+    KICKS = (W1, W0, W1)
+
+    def advance(self, system, time_step):
+        bodies = system.bodies
+        for i, kick in enumerate(self.KICKS):
+            bodies.x += bodies.vx * (self.DRIFTS[i] * time_step)
+            bodies.y += bodies.vy * (self.DRIFTS[i] * time_step)
+            ax, ay = system.compute_accelerations()
+            bodies.vx += ax * (kick * time_step)
+            bodies.vy += ay * (kick * time_step)
+        bodies.x += bodies.vx * (self.DRIFTS[3] * time_step)
+        bodies.y += bodies.vy * (self.DRIFTS[3] * time_step)
+
+
+# Class for the adaptive Runge-Kutta 4(5) scheme of Dormand and Prince
+class DormandPrince45(Integrator):
+    """Each time step is covered by as many sub-steps as needed for the local error
+    estimate to stay below the relative tolerance. The last accepted sub-step
+    size is kept as the first guess of the next time step.
+    """
+
+    name = "rk45"
+
+    A = (
+        (),
+        (1 / 5,),
+        (3 / 40, 9 / 40),
+        (44 / 45, -56 / 15, 32 / 9),
+        (19372 / 6561, -25360 / 2187, 64448 / 6561, -212 / 729),
+        (9017 / 3168, -355 / 33, 46732 / 5247, 49 / 176, -5103 / 18656),
+        (35 / 384, 0, 500 / 1113, 125 / 192, -2187 / 6784, 11 / 84),
+    )
+    # Difference between the fifth and the fourth order weights
+    E = (71 / 57600, 0, -71 / 16695, 71 / 1920, -17253 / 339200, 22 / 525, -1 / 40)
+
+    def __init__(self, tolerance=1e-9, max_substeps=10000):
+        self.tolerance = tolerance
+        self.max_substeps = max_substeps
+        self.substep = None
+
+    def _derivative(self, system, state, mass):
+        n = len(mass)
+        ax, ay = system.compute_accelerations(state[0:n], state[n:2 * n])
+        return np.concatenate((state[2 * n:3 * n], state[3 * n:4 * n], ax, ay))
+
+    def advance(self, system, time_step):
+        bodies = system.bodies
+        n = len(bodies)
+        if n == 0:
+            return
+        state = np.concatenate((bodies.x, bodies.y, bodies.vx, bodies.vy))
+        mass = bodies.mass
+        elapsed = 0.0
+        h = time_step if self.substep is None else min(self.substep, time_step)
+        k1 = self._derivative(system, state, mass)
+
+        substeps = 0
+        # The tolerance on the end of the step avoids sub-steps made of rounding errors
+        while time_step - elapsed > 1e-12 * time_step:
+            substeps += 1
+            if substeps > self.max_substeps:
+                raise RuntimeError(f"{self.max_substeps} sub-steps were not enough to reach the tolerance")
+            trial = min(h, time_step - elapsed)
+            k = [k1]
+            for row in self.A[1:]:
+                increment = sum(a * ki for a, ki in zip(row, k) if a)
+                k.append(self._derivative(system, state + trial * increment, mass))
+            # The seventh stage is evaluated at the fifth order solution (first same as last)
+            new_state = state + trial * sum(a * ki for a, ki in zip(self.A[6], k) if a)
+            error = trial * sum(e * ki for e, ki in zip(self.E, k) if e)
+
+            # Positions and velocities are compared to the typical magnitude of their own block
+            blocks = np.maximum(np.abs(state), np.abs(new_state)).reshape(4, n)
+            scale = self.tolerance * (blocks + blocks.mean(axis=1, keepdims=True))
+            ratio = float(np.max(np.abs(error).reshape(4, n) / scale))
+            factor = min(5.0, max(0.2, 0.9 * max(ratio, 1e-10) ** -0.2))
+
+            if ratio <= 1.0:
+                elapsed += trial
+                state = new_state
+                k1 = k[6]
+                # A sub-step shortened to land on the end of the step says nothing about the next one
+                h = max(h, trial * factor) if trial < h else trial * factor
+            else:
+                h = trial * factor
+        self.substep = h
+
+        bodies.x = state[0:n]
+        bodies.y = state[n:2 * n]
+        bodies.vx = state[2 * n:3 * n]
+        bodies.vy = state[3 * n:4 * n]
+
+    def get_state(self, system):
+        return {"tolerance": self.tolerance, "max_substeps": self.max_substeps, "substep": self.substep}
+
+    def set_state(self, state, system):
+        self.tolerance = state["tolerance"]
+        self.max_substeps = state["max_substeps"]
+        self.substep = state["substep"]
+
+
+# Class for the fourth order Hermite scheme with individual (block) time steps
+class BlockHermite(Integrator):
+    """Each body has its own time step, a power-of-two fraction of the simulation time step.
+
+    Times are counted in integer ticks of time_step / 2**max_level, so the
+    bins stay exactly commensurate. At each sub-step, only the bodies whose
+    step ends first are active: all positions are predicted to that time,
+    but only the active bodies get their acceleration and jerk recomputed
+    and corrected. A body's step comes from the Aarseth criterion, which uses
+    its acceleration, jerk and their Hermite-interpolated derivatives. A step
+    can only double when the new step stays aligned with the block
+    boundaries. No bin crosses the end of the simulation time step, so all
+    bodies are synchronized when step() returns and the renderer always sees
+    a consistent state.
+
+    The accelerations and jerks come from the exact direct sum, so the force
+    engine of the system is not used.
+    """
+
+    name = "block"
+
+    def __init__(self, eta=0.02, initial_eta=0.01, max_level=20, block_size=1024):
+        self.eta = eta
+        self.initial_eta = initial_eta
+        self.max_level = max_level
+        self.kernel = VectorizedForceEngine(block_size)
+        self.reset()
+
+    def reset(self):
+        self._version = None
+        self._time_step = None
+        self.level_counts = None
+
+    def get_state(self, system):
+        state = {"eta": self.eta, "initial_eta": self.initial_eta, "max_level": self.max_level}
+        if self._version == system.bodies.version:
+            state.update(time=self.time, tick=self.tick, time_step=self._time_step, last_time=self.last_time,
+                         steps=self.steps, derivatives=self.derivatives)
+        return state
+
+    def set_state(self, state, system):
+        self.eta = state["eta"]
+        self.initial_eta = state["initial_eta"]
+        self.max_level = state["max_level"]
+        self.reset()
+        if "time" in state:
+            self.time = state["time"]
+            self.tick = state["tick"]
+            self._time_step = state["time_step"]
+            self.last_time = state["last_time"]
+            self.steps = state["steps"]
+            self.derivatives = state["derivatives"]
+            self._version = system.bodies.version
+
+    def _acceleration_and_jerk(self, system, targets, x, y, vx, vy):
+        system.force_evaluations += len(targets)
+        return self.kernel.compute_accelerations_and_jerks_at(targets, x, y, vx, vy, system.bodies.mass, system.G)
+
+    def _start(self, system, time_step):
+        bodies = system.bodies
+        n = len(bodies)
+        self.tick = time_step / 2 ** self.max_level
+        self._time_step = time_step
+        self._version = bodies.version
+        self.time = 0
+        self.last_time = np.zeros(n, dtype=np.int64)
+        self.derivatives = self._acceleration_and_jerk(system, np.arange(n), bodies.x, bodies.y, bodies.vx, bodies.vy)
+        acceleration = np.hypot(self.derivatives[0], self.derivatives[1])
+        jerk = np.hypot(self.derivatives[2], self.derivatives[3])
+        with np.errstate(divide="ignore", invalid="ignore"):
+            desired = self.initial_eta * acceleration / jerk
+        self.steps = self._quantize(desired, np.full(n, 2 ** self.max_level, dtype=np.int64))
+
+    def _quantize(self, desired, limit):
+        """Largest power of two number of ticks not above the desired step, between 1 and limit."""
+        ticks = np.nan_to_num(desired / self.tick, nan=np.inf, posinf=np.inf)
+        ticks = np.clip(ticks, 1, 2 ** self.max_level)
+        steps = np.left_shift(1, np.floor(np.log2(ticks)).astype(np.int64))
+        return np.minimum(steps, limit)
+
+    def advance(self, system, time_step):
+        bodies = system.bodies
+        if len(bodies) == 0:
+            return
+        if self._version != bodies.version or self._time_step != time_step:
+            self._start(system, time_step)
+
+        tick = self.tick
+        end = self.time + 2 ** self.max_level
+        while self.time < end:
+            next_times = self.last_time + self.steps
+            now = next_times.min()
+            active = np.flatnonzero(next_times == now)
+
+            # Predict every body to the current time with its Taylor series
+            delay = (now - self.last_time) * tick
+            ax, ay, jx, jy = self.derivatives
+            half_delay2 = delay * delay / 2
+            sixth_delay3 = half_delay2 * delay / 3
+            x = bodies.x + bodies.vx * delay + ax * half_delay2 + jx * sixth_delay3
+            y = bodies.y + bodies.vy * delay + ay * half_delay2 + jy * sixth_delay3
+            vx = bodies.vx + ax * delay + jx * half_delay2
+            vy = bodies.vy + ay * delay + jy * half_delay2
+
+            # Hermite correction of the active bodies
+            a0x, a0y, j0x, j0y = self.derivatives[:, active]
+            a1x, a1y, j1x, j1y = new = self._acceleration_and_jerk(system, active, x, y, vx, vy)
+            h = self.steps[active] * tick
+            v0x, v0y = bodies.vx[active], bodies.vy[active]
+            v1x = v0x + (a0x + a1x) * h / 2 + (j0x - j1x) * h * h / 12
+            v1y = v0y + (a0y + a1y) * h / 2 + (j0y - j1y) * h * h / 12
+            bodies.x[active] = bodies.x[active] + (v0x + v1x) * h / 2 + (a0x - a1x) * h * h / 12
+            bodies.y[active] = bodies.y[active] + (v0y + v1y) * h / 2 + (a0y - a1y) * h * h / 12
+            bodies.vx[active] = v1x
+            bodies.vy[active] = v1y
+
+            # Aarseth criterion from the second and third derivatives of the acceleration
+            h2 = h * h
+            crackle_x = (12 * (a0x - a1x) + 6 * h * (j0x + j1x)) / (h2 * h)
+            crackle_y = (12 * (a0y - a1y) + 6 * h * (j0y + j1y)) / (h2 * h)
+            snap_x = (-6 * (a0x - a1x) - h * (4 * j0x + 2 * j1x)) / h2 + h * crackle_x
+            snap_y = (-6 * (a0y - a1y) - h * (4 * j0y + 2 * j1y)) / h2 + h * crackle_y
+            acceleration = np.hypot(a1x, a1y)
+            jerk = np.hypot(j1x, j1y)
+            snap = np.hypot(snap_x, snap_y)
+            crackle = np.hypot(crackle_x, crackle_y)
+            with np.errstate(divide="ignore", invalid="ignore"):
+                desired = np.sqrt(self.eta * (acceleration * snap + jerk * jerk) / (jerk * crackle + snap * snap))
+
+            # Steps shrink freely but only double when the doubled step stays aligned
+            old = self.steps[active]
+            can_double = (now % (2 * old) == 0) & (2 * old <= 2 ** self.max_level)
+            steps = self._quantize(desired, np.where(can_double, 2 * old, old))
+            self.steps[active] = steps
+            self.derivatives[:, active] = new
+            self.last_time[active] = now
+            self.time = now
+
+        self.level_counts = np.bincount(self.max_level - np.log2(self.steps).astype(int), minlength=self.max_level + 1)
+
+
+INTEGRATORS = {
+    integrator.name: integrator
+    for integrator in (SemiImplicitEuler, Leapfrog, Yoshida4, DormandPrince45, BlockHermite)
+}
+
+
+def make_integrator(name, **options):
+    """Create an integrator from its name: euler, leapfrog, yoshida4, rk45 or block."""
+    try:
+        return INTEGRATORS[name](**options)
+    except KeyError:
+        raise ValueError(f"Unknown integrator {name!r}, choose from {', '.join(INTEGRATORS)}") from None
@@ -0,0 +1,107 @@
+# Force engine spreading the direct sum over several processes through shared memory
+import multiprocessing
+import os
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from .forces import VectorizedForceEngine
+
+# Arrays shared between the engine and its workers, in this order
+SHARED_ARRAYS = ("x", "y", "mass", "ax", "ay", "potential")
+
+# Shared arrays of the current worker process, set by _attach
+_worker_arrays = {}
+
+
+def _attach(names, capacity, block_size):
+    for array_name, memory_name in zip(SHARED_ARRAYS, names):
+        # Workers share the resource tracker of the engine (spawn passes it on), which unlinks the memory in close()
+        memory = shared_memory.SharedMemory(name=memory_name)
+        _worker_arrays[array_name] = (memory, np.ndarray(capacity, dtype=np.float64, buffer=memory.buf))
+    _worker_arrays["kernel"] = VectorizedForceEngine(block_size)
+
+
+def _compute_tile(task):
+    """Accelerations (and potentials) of the targets [start, stop) against the first n bodies, written in place."""
+    start, stop, n, G, potential = task
+    x, y, mass, ax, ay, phi = (_worker_arrays[name][1] for name in SHARED_ARRAYS)
+    result = _worker_arrays["kernel"].compute_accelerations_at(np.arange(start, stop), x[:n], y[:n], mass[:n], G, potential)
+    ax[start:stop] = result[0]
+    ay[start:stop] = result[1]
+    if potential:
+        phi[start:stop] = result[2]
+    return stop - start
+
+
+# Class to compute the exact direct sum on several cores
+class ParallelForceEngine:
+    """The target bodies are split into tiles of tile_size bodies, distributed to a pool of workers.
+
+    Positions and masses are copied once per step into shared memory
+    buffers that every worker maps (zero copy), and each worker writes the
+    accelerations of its tiles into a shared output buffer: only the tile
+    bounds are sent to the workers. Tiles do not use Newton's third law, so
+    each worker does the full work of its rows (twice the pair count of
+    VectorizedForceEngine, spread over all the cores).
+    """
+
+    def __init__(self, workers=None, tile_size=2048, block_size=512):
+        self.workers = workers or os.cpu_count() or 1
+        self.tile_size = tile_size
+        self.block_size = block_size
+        self.capacity = 0
+        self._memories = []
+        self._arrays = {}
+        self._pool = None
+
+    def _allocate(self, n):
+        capacity = max(n, 2 * self.capacity, 1024)
+        self.close()
+        self._memories = [shared_memory.SharedMemory(create=True, size=capacity * 8) for _ in SHARED_ARRAYS]
+        self._arrays = {
+            name: np.ndarray(capacity, dtype=np.float64, buffer=memory.buf)
+            for name, memory in zip(SHARED_ARRAYS, self._memories)
+        }
+        self.capacity = capacity
+        # Spawned rather than forked: in the window, this runs on the physics thread
+        # of a process with pygame and writer threads, which a fork could deadlock
+        self._pool = multiprocessing.get_context("spawn").Pool(
+            self.workers,
+            initializer=_attach,
+            initargs=([memory.name for memory in self._memories], capacity, self.block_size),
+        )
+
+    def compute_accelerations(self, x, y, mass, G, potential=False):
+        n = len(x)
+        if n > self.capacity or self._pool is None:
+            self._allocate(n)
+        arrays = self._arrays
+        arrays["x"][:n] = x
+        arrays["y"][:n] = y
+        arrays["mass"][:n] = mass
+
+        tasks = [(start, min(start + self.tile_size, n), n, G, potential) for start in range(0, n, self.tile_size)]
+        self._pool.map(_compute_tile, tasks, chunksize=1)
+        if potential:
+            return arrays["ax"][:n].copy(), arrays["ay"][:n].copy(), arrays["potential"][:n].copy()
+        return arrays["ax"][:n].copy(), arrays["ay"][:n].copy()
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.terminate()
+            self._pool.join()
+            self._pool = None
+        # The arrays must be released before the memory they point to
+        self._arrays = {}
+        for memory in self._memories:
+            memory.close()
+            memory.unlink()
+        self._memories = []
+        self.capacity = 0
+
+    def __del__(self):
+        try:
+            self.close()
+        except Exception:
+            pass
@@ -0,0 +1,310 @@
+# Particle-mesh (FFT) gravity for very large, smooth distributions of bodies
+#
+# The bodies are 2D but attract each other with the 3D law G m / r^2, like a
+# razor-thin disk: the mesh potential is the convolution of the surface
+# density with -G / r, whose 2D Fourier transform is -2 pi G / k.
+import math
+
+import numpy as np
+
+from .collisions import iter_close_pairs
+
+# Cost of one cell of the (padded) mesh in close pairs of the short-range pass: the FFTs
+# and kernel products take about 90 ns per cell, a close pair about 200 ns with its
+# share of the cell-list candidates (measured with NumPy on one core)
+MESH_CELL_COST = 0.4
+
+
+def _erfc_factor(x):
+    """erfc(x) / exp(-x^2) for an array of x >= 0 (Abramowitz and Stegun 7.1.26, error of erfc < 1.5e-7)."""
+    t = 1 / (1 + 0.3275911 * x)
+    return t * (0.254829592 + t * (-0.284496736 + t * (1.421413741 + t * (-1.453152027 + t * 1.061405429))))
+
+
+def erfc(x):
+    """Complementary error function of an array of x >= 0."""
+    return _erfc_factor(x) * np.exp(-x * x)
+
+
+def _cic_weights(g, size, periodic):
+    """Lower node and weight of the upper node of each coordinate (in grid units) for cloud-in-cell."""
+    floor = np.floor(g)
+    if periodic:
+        return floor.astype(np.int64) % size, g - floor
+    # The last node is reached with a weight of 1 from the cell before it
+    lower = np.clip(floor.astype(np.int64), 0, size - 2)
+    return lower, g - lower
+
+
+# Class to compute accelerations on a mesh in O(N + M^2 log M)
+class ParticleMeshEngine:
+    """The masses are deposited on a grid_size x grid_size mesh by cloud-in-
+    cell, the field is obtained with FFTs and interpolated back to the bodies
+    with the same weights (so there is no self-force and momentum is kept).
+
+    boundary "isolated": the mesh covers the bounding square of the bodies
+    and is zero-padded to twice its size, so that there are no periodic
+    images (Hockney and Eastwood). boundary "periodic": space is the periodic
+    square box = (x0, y0, size), and the mean density is removed.
+
+    The mesh resolves forces down to a few cells only. With p3m, the force is
+    split as in P3M/TreePM: the mesh computes the long-range part, whose
+    potential is erf(r / 2 rs) / r (2D transform 2 pi erfc(k rs) / k), and
+    the short-range rest erfc(r / 2 rs) / r is summed directly over the pairs
+    closer than cutoff * rs, found with a cell list. rs is split cells.
+
+    The pairs closer than a fixed number of cells grow like N^2 / M^2, so
+    with p3m the mesh is chosen again at every call: grid_size doubled up to
+    max_grid_size, whichever has the lowest expected cost of FFTs and close
+    pairs (counted per cell of side cutoff * rs). The mesh then grows like
+    sqrt(N) and the pairs per body stay bounded: about 60 for exponential
+    disks of 10000 to 100000 bodies (a 2048^2 mesh and 2.8 s per
+    evaluation at 100000), fewer in uniform boxes. P3M only keeps its O(N + M^2 log M)
+    cost while the mesh can follow N: past max_grid_size the pairs per body
+    grow like N again. The isolated mesh spans the bounding square, so a few
+    far-out bodies coarsen it and add pairs in the same way.
+
+    With a 1/r^2 law in a plane, the pull of the nearest bodies does not
+    average out as N grows: plain PM gives the smooth part of the field only,
+    about 60% away from the exact direct sum per body (median, disks of
+    20000 to 100000 bodies on a 256^2 mesh), while P3M is within 2e-3 to 4e-3.
+    In periodic boxes, the images and the removed mean density also change
+    the force of bodies a fraction of the box apart.
+
+    With potential=True, the potential is computed on the same mesh (plus
+    the short-range pairs with p3m), and the potential of each body's own
+    cloud is removed exactly. In periodic boxes it is defined up to a
+    constant, as the mean density is removed.
+    """
+
+    def __init__(self, grid_size=256, boundary="isolated", box=None, p3m=False, split=1.25, cutoff=6.0,
+                 max_grid_size=2048):
+        if boundary not in ("isolated", "periodic"):
+            raise ValueError(f"Unknown boundary {boundary!r}, choose from isolated, periodic")
+        if boundary == "periodic" and box is None:
+            raise ValueError("periodic boundaries need box = (x0, y0, size)")
+        self.grid_size = grid_size
+        self.boundary = boundary
+        self.box = box
+        self.p3m = p3m
+        self.split = split
+        self.cutoff = cutoff
+        self.max_grid_size = max_grid_size
+        # Mesh of the last call (grid_size, or the mesh chosen by P3M)
+        self.mesh_size = grid_size
+        # Kernels by mesh size
+        self._kernels = {}
+        self._potential_kernels = {}
+
+    def _cell_size(self, size, m):
+        if self.boundary == "periodic":
+            return size / m
+        return size / (m - 1) if size > 0 else 1.0
+
+    def _pairs_per_body(self, x, y, x0, y0, size, m):
+        """Expected close pairs per body of the short-range pass on an m x m mesh.
+
+        The bodies are counted in cells of side cutoff * rs: a body of a
+        cell holding k bodies has about pi (k - 1) neighbours within cutoff * rs.
+        """
+        reach = self.cutoff * self.split * self._cell_size(size, m)
+        cells = int(size // reach) + 1
+        gx, gy = x - x0, y - y0
+        if self.boundary == "periodic":
+            gx, gy = gx % size, gy % size
+        cell_x = np.minimum((gx // reach).astype(np.int64), cells - 1)
+        cell_y = np.minimum((gy // reach).astype(np.int64), cells - 1)
+        counts = np.bincount(cell_x * cells + cell_y).astype(np.float64)
+        return math.pi / 2 * float(counts @ (counts - 1)) / len(x)
+
+    def _p3m_mesh_size(self, x, y, x0, y0, size):
+        """Mesh size of P3M: grid_size doubled up to max_grid_size, whichever has the
+        lowest expected cost of mesh cells and close pairs."""
+        padding = 1 if self.boundary == "periodic" else 2
+        best_cost, best = math.inf, self.grid_size
+        m = self.grid_size
+        while True:
+            cost = MESH_CELL_COST * (padding * m) ** 2 + len(x) * self._pairs_per_body(x, y, x0, y0, size, m)
+            # Both terms are monotonic in m, so the cost has a single minimum
+            if cost > best_cost:
+                break
+            best_cost, best = cost, m
+            if 2 * m > self.max_grid_size:
+                break
+            m *= 2
+        return best
+
+    def _isolated_kernels(self, grid_size):
+        """FFTs of the force kernels of the padded mesh, in grid units (cell side 1)."""
+        if grid_size not in self._kernels:
+            m = 2 * grid_size
+            offset = np.fft.fftfreq(m, 1 / m)
+            dx, dy = np.meshgrid(offset, offset, indexing="ij")
+            r = np.hypot(dx, dy)
+            r[0, 0] = 1.0
+            if self.p3m:
+                # Radial force of the potential erf(r / a) / r
+                a = 2 * self.split
+                force = (1 - erfc(r / a)) / r ** 2 - 2 / (math.sqrt(math.pi) * a) * np.exp(-(r / a) ** 2) / r
+            else:
+                force = 1 / r ** 2
+            force[0, 0] = 0.0
+            # A mass at offset 0 pulls the node at offset d towards -d
+            self._kernels[grid_size] = np.fft.rfft2(-force * dx / r), np.fft.rfft2(-force * dy / r)
+        return self._kernels[grid_size]
+
+    def _isolated_potential_kernel(self, grid_size):
+        """Real-space potential kernel of the padded mesh in grid units (times G / h), and its FFT."""
+        if grid_size not in self._potential_kernels:
+            m = 2 * grid_size
+            offset = np.fft.fftfreq(m, 1 / m)
+            r = np.hypot(offset[:, None], offset[None, :])
+            r[0, 0] = 1.0
+            if self.p3m:
+                kernel = -(1 - erfc(r / (2 * self.split))) / r
+                kernel[0, 0] = -2 / (math.sqrt(math.pi) * 2 * self.split)
+            else:
+                kernel = -1 / r
+                # Mean of 1/r over a cell centred on the mass
+                kernel[0, 0] = -4 * math.log(1 + math.sqrt(2))
+            self._potential_kernels[grid_size] = kernel, np.fft.rfft2(kernel)
+        return self._potential_kernels[grid_size]
+
+    def _periodic_green(self, m, size):
+        """Wave vectors and Green function 2 pi / (k h^2) of the periodic mesh (k in physical units)."""
+        h = size / m
+        kx = 2 * math.pi * np.fft.fftfreq(m, h)[:, None]
+        ky = 2 * math.pi * np.fft.rfftfreq(m, h)[None, :]
+        k = np.hypot(kx, ky)
+        k[0, 0] = 1.0
+        green = 2 * math.pi / (k * h * h)
+        if self.p3m:
+            green *= erfc(k * self.split * h)
+        green[0, 0] = 0.0
+        return kx, ky, green
+
+    def _periodic_kernel(self, m, size):
+        """Multipliers of the FFT of the mass grid giving ax and ay."""
+        if m not in self._kernels:
+            # phi_k = -2 pi G / k * surface density_k, a_k = -i k phi_k
+            kx, ky, green = self._periodic_green(m, size)
+            self._kernels[m] = 1j * kx * green, 1j * ky * green
+        return self._kernels[m]
+
+    def _periodic_potential_kernel(self, m, size):
+        """Real-space potential kernel of the periodic mesh (times G), and its FFT."""
+        if m not in self._potential_kernels:
+            _, _, green = self._periodic_green(m, size)
+            self._potential_kernels[m] = np.fft.irfft2(-green, s=(m, m)), -green
+        return self._potential_kernels[m]
+
+    def compute_accelerations(self, x, y, mass, G, potential=False):
+        n = len(x)
+        if n == 0:
+            return (np.zeros(0),) * (3 if potential else 2)
+        periodic = self.boundary == "periodic"
+        if periodic:
+            x0, y0, size = self.box
+        else:
+            x0, y0 = x.min(), y.min()
+            size = max(x.max() - x0, y.max() - y0)
+        m = self._p3m_mesh_size(x, y, x0, y0, size) if self.p3m else self.grid_size
+        self.mesh_size = m
+        h = self._cell_size(size, m)
+
+        # Cloud-in-cell deposit, the nodes being at x0 + i * h
+        gx, gy = (x - x0) / h, (y - y0) / h
+        ix, fx = _cic_weights(gx, m, periodic)
+        iy, fy = _cic_weights(gy, m, periodic)
+        jx = (ix + 1) % m
+        jy = (iy + 1) % m
+        corners = (
+            (ix, iy, (1 - fx) * (1 - fy)), (jx, iy, fx * (1 - fy)),
+            (ix, jy, (1 - fx) * fy), (jx, jy, fx * fy),
+        )
+        padded = m if periodic else 2 * m
+        grid = np.zeros(padded * padded)
+        for cx, cy, weight in corners:
+            grid += np.bincount(cx * padded + cy, mass * weight, minlength=padded * padded)
+        grid_fft = np.fft.rfft2(grid.reshape(padded, padded))
+
+        if periodic:
+            kernel_x, kernel_y = self._periodic_kernel(m, size)
+            field_x = np.fft.irfft2(grid_fft * kernel_x, s=(m, m)) * G
+            field_y = np.fft.irfft2(grid_fft * kernel_y, s=(m, m)) * G
+        else:
+            kernel_x, kernel_y = self._isolated_kernels(m)
+            # The kernels hold -d / r^3 in cells: a = G m d / r^3 / h^2 in meters
+            field_x = np.fft.irfft2(grid_fft * kernel_x, s=(padded, padded))[:m, :m] * (G / h ** 2)
+            field_y = np.fft.irfft2(grid_fft * kernel_y, s=(padded, padded))[:m, :m] * (G / h ** 2)
+
+        # Interpolation back to the bodies with the same weights
+        ax = np.zeros(n)
+        ay = np.zeros(n)
+        for cx, cy, weight in corners:
+            ax += field_x[cx, cy] * weight
+            ay += field_y[cx, cy] * weight
+
+        phi = None
+        if potential:
+            phi = self._mesh_potential(grid_fft, m, corners, fx, fy, mass, G, h, size)
+        if self.p3m:
+            self._add_short_range(x, y, mass, G, h, ax, ay, phi)
+        if potential:
+            return ax, ay, phi
+        return ax, ay
+
+    def _mesh_potential(self, grid_fft, m, corners, fx, fy, mass, G, h, size):
+        """Potential interpolated from the mesh, without the potential of each body's own cloud."""
+        if self.boundary == "periodic":
+            kernel, kernel_fft = self._periodic_potential_kernel(m, size)
+            grid = np.fft.irfft2(grid_fft * kernel_fft, s=(m, m)) * G
+            factor = G
+        else:
+            kernel, kernel_fft = self._isolated_potential_kernel(m)
+            grid = np.fft.irfft2(grid_fft * kernel_fft, s=(2 * m, 2 * m))[:m, :m] * (G / h)
+            factor = G / h
+        phi = np.zeros(len(mass))
+        for cx, cy, weight in corners:
+            phi += grid[cx, cy] * weight
+
+        # The cloud of a body covers 4 nodes: sum of weight_a * weight_b * kernel(a - b) over its
+        # pairs of nodes, grouped by whether the nodes share their x and y indices
+        same_x = (1 - fx) ** 2 + fx ** 2
+        same_y = (1 - fy) ** 2 + fy ** 2
+        self_potential = (same_x * same_y * kernel[0, 0]
+                          + ((1 - same_x) * same_y + same_x * (1 - same_y)) * kernel[1, 0]
+                          + (1 - same_x) * (1 - same_y) * kernel[1, 1])
+        phi -= factor * mass * self_potential
+        return phi
+
+    def _add_short_range(self, x, y, mass, G, h, ax, ay, phi=None):
+        """Add the erfc part of the force (and potential) of the pairs closer than cutoff * rs."""
+        rs = self.split * h
+        box = self.box if self.boundary == "periodic" else None
+        n = len(x)
+        for i, j in iter_close_pairs(x, y, self.cutoff * rs, box):
+            dx = x[j] - x[i]
+            dy = y[j] - y[i]
+            if box is not None:
+                size = box[2]
+                dx -= size * np.round(dx / size)
+                dy -= size * np.round(dy / size)
+            r2 = dx * dx + dy * dy
+            with np.errstate(divide="ignore", invalid="ignore"):
+                r = np.sqrt(r2)
+                u = r / (2 * rs)
+                gaussian = np.exp(-u * u)
+                erfc_u = _erfc_factor(u) * gaussian
+                factor = G * (erfc_u + 2 / math.sqrt(math.pi) * u * gaussian) / (r2 * r)
+            # Coincident bodies do not attract each other
+            factor[r2 == 0] = 0.0
+            if phi is not None:
+                with np.errstate(divide="ignore", invalid="ignore"):
+                    pair_potential = -G * erfc_u / r
+                pair_potential[r2 == 0] = 0.0
+                phi += np.bincount(i, pair_potential * mass[j], minlength=n) + np.bincount(j, pair_potential * mass[i], minlength=n)
+            dx *= factor
+            dy *= factor
+            ax += np.bincount(i, dx * mass[j], minlength=n) - np.bincount(j, dx * mass[i], minlength=n)
+            ay += np.bincount(i, dy * mass[j], minlength=n) - np.bincount(j, dy * mass[i], minlength=n)
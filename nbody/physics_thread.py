@@ -0,0 +1,98 @@
+# Physics running on a worker thread, publishing snapshots for the render loop
+import threading
+import time
+
+
+# Class holding a copy of the bodies taken after a physics step
+class Snapshot:
+    __slots__ = ("x", "y", "display_radius", "color", "version", "step_count", "elapsed_time", "published")
+
+    def __init__(self, simulation):
+        bodies = simulation.system.bodies
+        self.x = bodies.x.copy()
+        self.y = bodies.y.copy()
+        self.display_radius = bodies.display_radius.copy()
+        self.color = bodies.color.copy()
+        self.version = bodies.version
+        self.step_count = simulation.step_count
+        self.elapsed_time = simulation.elapsed_time
+        self.published = time.perf_counter()
+
+
+# Class to step a Simulation on a worker thread (producer) while the window draws (consumer)
+class PhysicsWorker(threading.Thread):
+    """The worker publishes a Snapshot after each batch of steps and keeps the
+    previous one, so that the render loop can interpolate between the two.
+
+    With steps_per_frame = N, the worker runs N steps each time the render
+    loop calls request_frame(). With steps_per_frame = None, it steps as fast
+    as possible and publishes after every step. No step is run while
+    simulation.paused is set.
+    """
+
+    def __init__(self, simulation, steps_per_frame=1):
+        super().__init__(name="physics", daemon=True)
+        self.simulation = simulation
+        self.steps_per_frame = steps_per_frame
+        self._lock = threading.Lock()
+        self._frame_requested = threading.Event()
+        self._stopped = threading.Event()
+        self._previous = None
+        self._latest = Snapshot(simulation)
+        self.error = None
+
+    def run(self):
+        try:
+            while not self._stopped.is_set():
+                if self.simulation.paused:
+                    self._stopped.wait(0.1)
+                    continue
+                if self.steps_per_frame is None:
+                    self.simulation.step()
+                else:
+                    # Wake up regularly to notice stop() even when no frame is requested
+                    if not self._frame_requested.wait(0.1):
+                        continue
+                    self._frame_requested.clear()
+                    for _ in range(self.steps_per_frame):
+                        self.simulation.step()
+                        if self.simulation.paused:
+                            break
+                self.publish()
+        except Exception as error:
+            # Kept for the render loop, which reraises it
+            self.error = error
+
+    def publish(self):
+        with self.simulation.profiler.phase("publish"):
+            snapshot = Snapshot(self.simulation)
+        with self._lock:
+            self._previous, self._latest = self._latest, snapshot
+
+    def request_frame(self):
+        self._frame_requested.set()
+
+    def stop(self):
+        self._stopped.set()
+
+    def snapshots(self):
+        with self._lock:
+            return self._previous, self._latest
+
+    def positions(self, interpolate=True, now=None):
+        """Positions to draw: the latest snapshot, or a blend of the last two.
+
+        Blending draws the bodies one snapshot late, but moves them smoothly
+        at the render frame rate. It is skipped when bodies merged in between.
+        """
+        if self.error is not None:
+            raise RuntimeError("the physics thread stopped") from self.error
+        previous, latest = self.snapshots()
+        if not interpolate or previous is None or previous.version != latest.version:
+            return latest, latest.x, latest.y
+        interval = latest.published - previous.published
+        now = time.perf_counter() if now is None else now
+        alpha = min(max((now - latest.published) / interval, 0.0), 1.0) if interval > 0 else 1.0
+        x = previous.x + alpha * (latest.x - previous.x)
+        y = previous.y + alpha * (latest.y - previous.y)
+        return latest, x, y
@@ -0,0 +1,37 @@
+# Preset systems, stored as JSON files in the data directory
+import json
+import os
+
+DATA_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+
+
+def preset_names():
+    return sorted(name[:-len(".json")] for name in os.listdir(DATA_DIRECTORY) if name.endswith(".json"))
+
+
+def read_preset(name):
+    """The content of a preset file: its bodies (as dicts) and its suggested settings (scale_factor, time_step)."""
+    path = os.path.join(DATA_DIRECTORY, name + ".json")
+    if not os.path.exists(path):
+        raise ValueError(f"Unknown preset {name!r}, choose from {', '.join(preset_names())}")
+    with open(path) as file:
+        return json.load(file)
+
+
+def load_preset(name):
+    """BodyStore holding the bodies of a preset. A display_radius given in the file replaces the computed one."""
+    from .bodystore import BodyStore, to_rgb
+
+    bodies = read_preset(name)["bodies"]
+    store = BodyStore(len(bodies))
+    store.append_arrays(
+        **{field: [body[field] for body in bodies] for field in ("mass", "x", "y", "vx", "vy", "density")},
+        color=[to_rgb(body["color"]) for body in bodies],
+    )
+    if all("display_radius" in body for body in bodies):
+        store.display_radius = [body["display_radius"] for body in bodies]
+    return store
+
+
+def solar_system():
+    return load_preset("solar")
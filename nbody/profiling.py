@@ -0,0 +1,162 @@
+# Per-phase timers and counters of the simulation loop, with a Chrome trace export
+#
+# The simulation, the physics worker and the window time their phases with
+#     with profiler.phase("forces"):
+#         ...
+# and report counters with profiler.add(name, amount) (totals, such as merges)
+# or profiler.set(name, value) (gauges, such as the culled bodies of a frame).
+# When profiling is off they use NULL_PROFILER, whose methods do nothing.
+import json
+import os
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+
+# Context manager timing one phase
+class _Phase:
+    __slots__ = ("profiler", "name", "start")
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.profiler.record(self.name, self.start, time.perf_counter_ns())
+
+
+# Profiler doing nothing, used when profiling is disabled
+class NullProfiler:
+    enabled = False
+
+    def __init__(self):
+        self._phase = _NullPhase()
+
+    def phase(self, name):
+        return self._phase
+
+    def add(self, name, amount=1):
+        pass
+
+    def set(self, name, value):
+        pass
+
+
+class _NullPhase:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+
+NULL_PROFILER = NullProfiler()
+
+
+# Class collecting the durations of the phases and the counters, from any thread
+class Profiler:
+    """Keeps the last `window` durations of every phase for the rolling
+    percentiles, and the totals (add) and last values (set) of the counters.
+
+    With trace, every phase and counter update is also kept as an event of
+    the Chrome trace format (at most max_events, the oldest are dropped):
+    export_trace() writes a JSON file that chrome://tracing or Perfetto open
+    as a timeline, one row per thread.
+    """
+
+    enabled = True
+
+    def __init__(self, window=256, trace=False, max_events=1_000_000):
+        self.window = window
+        self.trace = trace
+        self.durations = {}
+        self.counters = {}
+        self._events = deque(maxlen=max_events) if trace else None
+        self._threads = {}
+        self._origin = time.perf_counter_ns()
+        self._lock = threading.Lock()
+
+    def phase(self, name):
+        return _Phase(self, name)
+
+    def record(self, name, start, stop):
+        """Record a phase that ran from start to stop (time.perf_counter_ns())."""
+        with self._lock:
+            durations = self.durations.get(name)
+            if durations is None:
+                durations = self.durations[name] = deque(maxlen=self.window)
+            durations.append(stop - start)
+            if self.trace:
+                self._events.append(("X", name, start, stop - start, self._thread_id()))
+
+    def add(self, name, amount=1):
+        with self._lock:
+            value = self.counters[name] = self.counters.get(name, 0) + amount
+            if self.trace:
+                self._events.append(("C", name, time.perf_counter_ns(), value, self._thread_id()))
+
+    def set(self, name, value):
+        with self._lock:
+            self.counters[name] = value
+            if self.trace:
+                self._events.append(("C", name, time.perf_counter_ns(), value, self._thread_id()))
+
+    def _thread_id(self):
+        thread = threading.current_thread()
+        self._threads.setdefault(thread.ident, thread.name)
+        return thread.ident
+
+    def percentiles(self, name, q=(50, 95, 99)):
+        """Rolling percentiles of the durations of a phase, in seconds."""
+        with self._lock:
+            durations = np.array(self.durations.get(name, ()), dtype=np.float64)
+        if len(durations) == 0:
+            return None
+        return np.percentile(durations, q) * 1e-9
+
+    def summary(self, q=(50, 95, 99)):
+        """Percentiles (in seconds) of every phase and value of every counter."""
+        with self._lock:
+            names = list(self.durations)
+            counters = dict(self.counters)
+        return {
+            "phases": {name: dict(zip((f"p{p:g}" for p in q), self.percentiles(name, q).tolist())) for name in names},
+            "counters": counters,
+        }
+
+    def report(self):
+        """Summary as lines of text, for the HUD and the end of headless runs."""
+        summary = self.summary()
+        width = max(map(len, [*summary["phases"], *summary["counters"]]), default=0)
+        lines = [f"{name:>{width}}  p50 {p['p50'] * 1e3:7.2f}  p95 {p['p95'] * 1e3:7.2f}  p99 {p['p99'] * 1e3:7.2f} ms"
+                 for name, p in summary["phases"].items()]
+        lines += [f"{name:>{width}}  {value:g}" for name, value in summary["counters"].items()]
+        return lines
+
+    def export_trace(self, path):
+        if not self.trace:
+            raise RuntimeError("the profiler was created without trace=True")
+        pid = os.getpid()
+        with self._lock:
+            events = list(self._events)
+            threads = dict(self._threads)
+        trace_events = [
+            {"name": "thread_name", "ph": "M", "pid": pid, "tid": tid, "args": {"name": name}}
+            for tid, name in threads.items()
+        ]
+        for kind, name, start, value, tid in events:
+            timestamp = (start - self._origin) / 1e3
+            if kind == "X":
+                trace_events.append({"name": name, "ph": "X", "ts": timestamp, "dur": value / 1e3, "pid": pid, "tid": tid})
+            else:
+                trace_events.append({"name": name, "ph": "C", "ts": timestamp, "pid": pid, "tid": tid, "args": {name: value}})
+        with open(path, "w") as file:
+            json.dump({"traceEvents": trace_events, "displayTimeUnit": "ms"}, file)
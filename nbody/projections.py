@@ -0,0 +1,183 @@
+# Display projections: the per-object functions of simulation2.py, and their
+# vectorized versions used as view modes by MainWindow
+import math
+
+import numpy as np
+
+SCALE_FACTOR_LINEAR = 90e8
+SCALE_FACTOR_NONLINEAR = 20
+SCALE_FACTOR_LOG = 20
+
+
+def cartesian_to_polar(x, y):
+    """Convert Cartesian coordinates to polar coordinates."""
+    radius = math.sqrt(x**2 + y**2)
+    angle = math.atan2(y, x)
+    return radius, angle
+
+def polar_to_cartesian(radius, angle):
+    """Convert polar coordinates to Cartesian coordinates."""
+    x = radius * math.cos(angle)
+    y = radius * math.sin(angle)
+    return x, y
+
+def translate_coordinates(obj, width, height, scale_factor = SCALE_FACTOR_LINEAR):
+    """Translate object coordinates to the center of the screen."""
+    translated_x = math.floor(obj.x / scale_factor) + width // 2
+    translated_y = math.floor(obj.y / scale_factor) + height // 2
+    return translated_x, translated_y
+
+def translate_coordinates_log(obj, width, height, scale_factor = SCALE_FACTOR_LOG):
+    """Translate object coordinates to the center of the screen."""
+    radius,angle = cartesian_to_polar(obj.x,obj.y)
+    radius = math.log10(radius + 1)
+    x,y = polar_to_cartesian(radius,angle)
+    translated_x = math.floor(x * scale_factor) + width // 2
+    translated_y = math.floor(y * scale_factor) + height // 2
+    return translated_x, translated_y
+
+def nonlinear_translate_coordinates(obj, width, height, x_scale_factor=SCALE_FACTOR_NONLINEAR, y_scale_factor=SCALE_FACTOR_NONLINEAR):
+    """Translate object coordinates to the center of the screen with nonlinear scaling."""
+    if obj.x < 0:
+        translated_x = math.floor(-math.log10(abs(obj.x) + 1) * x_scale_factor) + width // 2
+    else:
+        translated_x = math.floor(math.log10(abs(obj.x) + 1) * x_scale_factor) + width // 2
+    if obj.y < 0:
+        translated_y = math.floor(-math.log10(abs(obj.y) + 1) * y_scale_factor) + height // 2
+    else:
+        translated_y = math.floor(math.log10(abs(obj.y) + 1) * y_scale_factor) + height // 2
+    return translated_x, translated_y
+
+def translate_coordinates_nonlinear(obj, width, height, factor=1.0):
+    """Translate object coordinates to the center of the screen with nonlinear scaling."""
+    distance = math.sqrt(obj.x ** 2 + obj.y ** 2)
+    scaled_distance = math.log(distance + 1) * factor
+    angle = math.atan2(obj.y, obj.x)
+    translated_x = math.floor(scaled_distance * math.cos(angle)) + width // 2
+    translated_y = math.floor(scaled_distance * math.sin(angle)) + height // 2
+    return translated_x, translated_y
+
+
+# Base class of the view modes: screen coordinates of all the bodies at once
+class Projection:
+    """The constants of the camera (scale, zoom, centre) are computed only
+    when the pan, the zoom or the window size change. With a key (such as the
+    step of the snapshot being drawn), the screen coordinates themselves are
+    reused as long as neither the key nor the camera changes.
+    """
+
+    name = None
+
+    def __init__(self):
+        self._camera = None
+        self._constants = None
+        self._key = None
+        self._result = None
+
+    def project(self, x, y, event_manager, width, height, key=None):
+        camera = (event_manager.current_scale_factor, event_manager.initial_scale_factor,
+                  event_manager.offset_x, event_manager.offset_y, width, height)
+        if camera != self._camera:
+            self._camera = camera
+            self._constants = self.camera_constants(*camera)
+            self._key = None
+        elif key is not None and key == self._key:
+            return self._result
+        result = self.transform(x, y, self._constants)
+        self._key, self._result = key, result
+        return result
+
+    def camera_constants(self, scale_factor, initial_scale_factor, offset_x, offset_y, width, height):
+        # Zoom relative to the initial scale, and screen position of the origin
+        return initial_scale_factor / scale_factor, width // 2 - offset_x, height // 2 - offset_y
+
+    def transform(self, x, y, constants):
+        raise NotImplementedError
+
+
+# Class for the linear view of MainWindow.translate_position
+class LinearProjection(Projection):
+    name = "linear"
+
+    def camera_constants(self, scale_factor, initial_scale_factor, offset_x, offset_y, width, height):
+        return 1 / scale_factor, width // 2 - offset_x, height // 2 - offset_y
+
+    def transform(self, x, y, constants):
+        inverse_scale, center_x, center_y = constants
+        return np.floor(x * inverse_scale) + center_x, np.floor(y * inverse_scale) + center_y
+
+
+# Class for translate_coordinates_log: the distance to the origin is replaced by its log10
+class LogProjection(Projection):
+    """Same direction, distance log10(r + 1) * pixels_per_decade. The
+    direction is x / r and y / r, which replaces atan2, cos and sin.
+    """
+
+    name = "log"
+
+    def __init__(self, pixels_per_decade=SCALE_FACTOR_LOG):
+        super().__init__()
+        self.pixels_per_decade = pixels_per_decade
+
+    def radial_scale(self, r):
+        # Overwrites r with log10(r + 1)
+        r += 1
+        return np.log10(r, out=r)
+
+    def transform(self, x, y, constants):
+        zoom, center_x, center_y = constants
+        # In-place operations on two temporaries keep this close to the linear view
+        r = np.multiply(x, x)
+        r += y * y
+        np.sqrt(r, out=r)
+        factor = self.radial_scale(r.copy())
+        factor *= self.pixels_per_decade * zoom
+        np.divide(factor, r, out=factor, where=r > 0)
+        screen_x = np.multiply(x, factor, out=r)
+        screen_y = np.multiply(y, factor, out=factor)
+        for screen, center in ((screen_x, center_x), (screen_y, center_y)):
+            np.floor(screen, out=screen)
+            screen += center
+        return screen_x, screen_y
+
+
+# Class for translate_coordinates_nonlinear: natural log of the distance
+class NaturalLogProjection(LogProjection):
+    name = "ln"
+
+    # ln(r + 1) is 2.3 times log10(r + 1): half the pixels keep the solar system in the window
+    def __init__(self, factor=SCALE_FACTOR_NONLINEAR / 2):
+        super().__init__(factor)
+
+    def radial_scale(self, r):
+        return np.log1p(r, out=r)
+
+
+# Class for nonlinear_translate_coordinates: each axis is log-scaled separately
+class AxisLogProjection(Projection):
+    name = "log-axes"
+
+    def __init__(self, pixels_per_decade=SCALE_FACTOR_NONLINEAR):
+        super().__init__()
+        self.pixels_per_decade = pixels_per_decade
+
+    def transform(self, x, y, constants):
+        zoom, center_x, center_y = constants
+        scale = self.pixels_per_decade * zoom
+        projected = []
+        for position, center in ((x, center_x), (y, center_y)):
+            screen = np.abs(position)
+            screen += 1
+            np.log10(screen, out=screen)
+            np.copysign(screen, position, out=screen)
+            screen *= scale
+            np.floor(screen, out=screen)
+            screen += center
+            projected.append(screen)
+        return tuple(projected)
+
+
+VIEW_MODES = {
+    projection.name: projection
+    for projection in (LinearProjection, LogProjection, NaturalLogProjection, AxisLogProjection)
+}
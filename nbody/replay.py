@@ -0,0 +1,146 @@
+# Replay of a recorded trajectory in a pygame window, without any physics
+import threading
+from collections import OrderedDict
+
+from .window import EventManager, project_positions, draw_bodies
+from .trajectory import TrajectoryReader
+
+
+# Class to decode the upcoming frames of a trajectory on a background thread
+class FramePrefetcher(threading.Thread):
+    """Keeps up to cache_size decoded frames, and decodes the next `ahead`
+    frames in the playback direction (stride frames apart) as soon as the
+    player moves to a new position.
+    """
+
+    def __init__(self, reader, ahead=16, cache_size=64):
+        super().__init__(name="prefetch", daemon=True)
+        self.reader = reader
+        self.ahead = ahead
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self._wanted = threading.Condition(self._lock)
+        self._position, self._stride = 0, 1
+        self._stopped = False
+
+    def run(self):
+        while True:
+            with self._wanted:
+                self._wanted.wait_for(lambda: self._stopped or self._next_missing() is not None)
+                if self._stopped:
+                    return
+                k = self._next_missing()
+            frame = self.reader[k]
+            self._store(k, frame)
+
+    def _next_missing(self):
+        for i in range(1, self.ahead + 1):
+            k = self._position + i * self._stride
+            if not 0 <= k < len(self.reader):
+                return None
+            if k not in self._cache:
+                return k
+        return None
+
+    def _store(self, k, frame):
+        with self._lock:
+            self._cache[k] = frame
+            self._cache.move_to_end(k)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def get(self, k, stride=1):
+        """Frame k, decoded now if it was not prefetched, and announce the playback position."""
+        with self._lock:
+            self._position, self._stride = k, stride if stride else 1
+            frame = self._cache.get(k)
+            if frame is not None:
+                self._cache.move_to_end(k)
+            self._wanted.notify()
+        if frame is None:
+            frame = self.reader[k]
+            self._store(k, frame)
+        return frame
+
+    def stop(self):
+        with self._lock:
+            self._stopped = True
+            self._wanted.notify()
+
+
+# Class to play a trajectory file back with the pan and zoom of the simulation window
+class ReplayWindow:
+    """Keys: space pauses, left/right scrub by one second of playback (one frame
+    when paused), up/down double or halve the speed, home/end jump to the
+    first/last frame, and backspace reverses the playback. speed is in
+    recorded frames per displayed frame: above 1, frames are skipped, below 1,
+    frames are held.
+    """
+
+    def __init__(self, path, width, height, fps, scale_factor, speed=1.0, splat_radius=1,
+                 window_name="Gravitational trajectory replay"):
+        self.reader = TrajectoryReader(path)
+        if len(self.reader) == 0:
+            raise ValueError(f"{path} does not contain any frame")
+        self.width = width
+        self.height = height
+        self.fps = fps
+        self.speed = speed
+        self.splat_radius = splat_radius
+        self.position = 0.0
+        self.paused = False
+        self.event_manager = EventManager(scale_factor)
+        self.prefetcher = FramePrefetcher(self.reader)
+
+        import pygame
+        pygame.init()
+        self.screen = pygame.display.set_mode((self.width, self.height))
+        pygame.display.set_caption(window_name)
+        self.clock = pygame.time.Clock()
+        self.font = pygame.font.Font(None, 20)
+
+    def handle_key(self, event):
+        import pygame
+        last = len(self.reader) - 1
+        scrub = 1 if self.paused else max(abs(self.speed) * self.fps, 1)
+        if event.key == pygame.K_SPACE:
+            self.paused = not self.paused
+        elif event.key == pygame.K_RIGHT:
+            self.position = min(self.position + scrub, last)
+        elif event.key == pygame.K_LEFT:
+            self.position = max(self.position - scrub, 0)
+        elif event.key == pygame.K_UP:
+            self.speed *= 2
+        elif event.key == pygame.K_DOWN:
+            self.speed /= 2
+        elif event.key == pygame.K_BACKSPACE:
+            self.speed = -self.speed
+        elif event.key == pygame.K_HOME:
+            self.position = 0
+        elif event.key == pygame.K_END:
+            self.position = last
+
+    def run(self):
+        import pygame
+        self.prefetcher.start()
+        while True:
+            self.event_manager.handle_events(self.handle_key)
+            self.event_manager.handle_mouse_drag()
+
+            self.draw_frame()
+            pygame.display.flip()
+            self.clock.tick(self.fps)
+
+            if not self.paused:
+                self.position = min(max(self.position + self.speed, 0), len(self.reader) - 1)
+
+    def draw_frame(self):
+        k = int(self.position)
+        frame = self.prefetcher.get(k, stride=int(round(self.speed)) or (1 if self.speed >= 0 else -1))
+        screen_x, screen_y = project_positions(frame.x, frame.y, self.event_manager, self.width, self.height)
+        draw_bodies(self.screen, screen_x, screen_y, frame.display_radius, frame.color, self.splat_radius)
+
+        status = f"frame {k + 1}/{len(self.reader)}  step {frame.step}  t = {frame.time / 86400:.1f} d  " \
+                 f"speed {self.speed:g}x{'  paused' if self.paused else ''}"
+        self.screen.blit(self.font.render(status, True, (200, 200, 200)), (8, self.height - 22))
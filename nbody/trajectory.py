@@ -0,0 +1,217 @@
+# Streaming trajectory files: a background writer and a memory-mapped reader
+#
+# A trajectory is two files:
+# - path: a 64-byte header followed by the frames, appended one after the other.
+#   Each frame is a 48-byte frame header (number of bodies, step, time, origin
+#   and quantum of the positions) followed by its columns: x, y, display radius
+#   (float32) and color (3 x uint8), padded to 8 bytes.
+# - path + ".idx": the int64 byte offset of every frame, so that frame K is
+#   found in O(1) without reading the frames before it.
+import os
+import queue
+import struct
+import threading
+
+import numpy as np
+
+MAGIC = b"NBTRAJ01"
+FILE_HEADER = struct.Struct("<8sI8s44x")
+FRAME_HEADER = struct.Struct("<qqdddd")
+
+# Storage of the positions: float, or quantized relative to the bounding box of the frame
+POSITION_FORMATS = {
+    "float64": np.dtype("<f8"),
+    "float32": np.dtype("<f4"),
+    "uint16": np.dtype("<u2"),
+    "uint32": np.dtype("<u4"),
+}
+
+
+def _padding(size):
+    return -size % 8
+
+
+def encode_positions(x, y, position_format):
+    """Return origin, quantum and the encoded x and y columns.
+
+    Quantized formats store (position - origin) / quantum rounded to the
+    nearest integer, the origin being the lower corner of the frame, so the
+    error is at most quantum / 2.
+    """
+    dtype = POSITION_FORMATS[position_format]
+    if dtype.kind == "f" or len(x) == 0:
+        return 0.0, 0.0, 0.0, x.astype(dtype), y.astype(dtype)
+    origin_x, origin_y = float(x.min()), float(y.min())
+    extent = max(float(x.max()) - origin_x, float(y.max()) - origin_y)
+    quantum = extent / np.iinfo(dtype).max if extent > 0 else 1.0
+    encoded_x = np.rint((x - origin_x) / quantum).astype(dtype)
+    encoded_y = np.rint((y - origin_y) / quantum).astype(dtype)
+    return origin_x, origin_y, quantum, encoded_x, encoded_y
+
+
+# Class to write the frames of a simulation to a trajectory file on a background thread
+class TrajectoryWriter:
+    """Attach it with simulation.add_observer(writer, every=K) or call record().
+
+    record() only copies the arrays and puts them in a bounded queue: the
+    encoding and the disk writes happen on the writer thread, so stepping is
+    not stalled unless the disk falls behind by more than queue_size frames.
+    """
+
+    def __init__(self, path, position_format="float64", queue_size=8):
+        if position_format not in POSITION_FORMATS:
+            raise ValueError(f"Unknown position format {position_format!r}, choose from {', '.join(POSITION_FORMATS)}")
+        self.path = path
+        self.position_format = position_format
+        self.frame_count = 0
+        self._file = open(path, "wb")
+        self._index = open(path + ".idx", "wb")
+        self._file.write(FILE_HEADER.pack(MAGIC, 1, position_format.encode()))
+        self._offset = FILE_HEADER.size
+        self._queue = queue.Queue(queue_size)
+        self._error = None
+        self._thread = threading.Thread(target=self._write_frames, name="trajectory-writer", daemon=True)
+        self._thread.start()
+
+    def __call__(self, simulation):
+        self.record(simulation)
+
+    def record(self, simulation):
+        if self._error is not None:
+            raise RuntimeError("the trajectory writer stopped") from self._error
+        bodies = simulation.system.bodies
+        self._queue.put((
+            simulation.step_count, simulation.elapsed_time,
+            bodies.x.copy(), bodies.y.copy(), bodies.display_radius.astype(np.float32), bodies.color.copy(),
+        ))
+        self.frame_count += 1
+
+    def _write_frames(self):
+        while True:
+            frame = self._queue.get()
+            try:
+                if frame is None:
+                    return
+                self._write_frame(*frame)
+            except Exception as error:
+                self._error = error
+            finally:
+                self._queue.task_done()
+
+    def _write_frame(self, step, time, x, y, display_radius, color):
+        if self._error is not None:
+            return
+        origin_x, origin_y, quantum, encoded_x, encoded_y = encode_positions(x, y, self.position_format)
+        n = len(x)
+        columns = [
+            FRAME_HEADER.pack(n, step, time, origin_x, origin_y, quantum),
+            encoded_x.tobytes(), encoded_y.tobytes(), display_radius.tobytes(), color.tobytes(),
+        ]
+        size = sum(len(column) for column in columns)
+        columns.append(b"\0" * _padding(size))
+        self._file.write(b"".join(columns))
+        self._index.write(struct.pack("<q", self._offset))
+        self._offset += size + _padding(size)
+
+    def flush(self):
+        """Wait until every recorded frame is on disk."""
+        self._queue.join()
+        self._file.flush()
+        self._index.flush()
+        if self._error is not None:
+            raise RuntimeError("the trajectory writer stopped") from self._error
+
+    def close(self):
+        if self._file.closed:
+            return
+        self._queue.put(None)
+        self._thread.join()
+        self._file.close()
+        self._index.close()
+        if self._error is not None:
+            raise RuntimeError("the trajectory writer stopped") from self._error
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+# Class holding one decoded frame
+class Frame:
+    __slots__ = ("step", "time", "x", "y", "display_radius", "color")
+
+    def __init__(self, step, time, x, y, display_radius, color):
+        self.step = step
+        self.time = time
+        self.x = x
+        self.y = y
+        self.display_radius = display_radius
+        self.color = color
+
+    def __len__(self):
+        return len(self.x)
+
+
+# Class to read a trajectory file without loading it
+class TrajectoryReader:
+    """The data and index files are memory-mapped: reader[k] decodes frame k only."""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as file:
+            magic, version, position_format = FILE_HEADER.unpack(file.read(FILE_HEADER.size))
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a trajectory file")
+        self.version = version
+        self.position_format = position_format.rstrip(b"\0").decode()
+        self._dtype = POSITION_FORMATS[self.position_format]
+        self.refresh()
+
+    def refresh(self):
+        """Map the files again, to see the frames written since the reader was opened."""
+        self._data = np.memmap(self.path, dtype=np.uint8, mode="r")
+        index_size = os.path.getsize(self.path + ".idx") // 8
+        self._offsets = np.memmap(self.path + ".idx", dtype="<i8", mode="r", shape=(index_size,)) if index_size else np.zeros(0, dtype="<i8")
+        # Frames announced in the index but not yet completely written are ignored
+        self._count = index_size
+        while self._count and not self._is_complete(int(self._offsets[self._count - 1])):
+            self._count -= 1
+
+    def _is_complete(self, offset):
+        if offset + FRAME_HEADER.size > len(self._data):
+            return False
+        n = FRAME_HEADER.unpack_from(self._data, offset)[0]
+        return offset + FRAME_HEADER.size + n * (2 * self._dtype.itemsize + 7) <= len(self._data)
+
+    def __len__(self):
+        return self._count
+
+    def __getitem__(self, k):
+        if k < 0:
+            k += self._count
+        if not 0 <= k < self._count:
+            raise IndexError("frame index out of range")
+        offset = int(self._offsets[k])
+        n, step, time, origin_x, origin_y, quantum = FRAME_HEADER.unpack_from(self._data, offset)
+        dtype = self._dtype
+        offset += FRAME_HEADER.size
+        x = np.frombuffer(self._data, dtype=dtype, count=n, offset=offset)
+        offset += n * dtype.itemsize
+        y = np.frombuffer(self._data, dtype=dtype, count=n, offset=offset)
+        offset += n * dtype.itemsize
+        display_radius = np.frombuffer(self._data, dtype="<f4", count=n, offset=offset)
+        offset += n * 4
+        color = np.frombuffer(self._data, dtype=np.uint8, count=3 * n, offset=offset).reshape(n, 3)
+
+        if dtype.kind == "f":
+            x, y = x.astype(np.float64), y.astype(np.float64)
+        else:
+            x = origin_x + x * quantum
+            y = origin_y + y * quantum
+        return Frame(step, time, x, y, display_radius, color)
+
+    def __iter__(self):
+        for k in range(len(self)):
+            yield self[k]
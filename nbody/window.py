@@ -0,0 +1,249 @@
+# pygame front end: events, the main window and vectorized drawing (pygame is imported when a window opens)
+import math
+import sys
+import numpy as np
+from .core import Simulation
+from .physics_thread import PhysicsWorker
+from .profiling import Profiler
+from .projections import VIEW_MODES
+
+# Class to manage events
+class EventManager:
+    def __init__(self, scale_factor):
+        self.offset_x, self.offset_y = 0, 0
+        self.current_scale_factor = scale_factor
+        # Reference of the zoom of the nonlinear views
+        self.initial_scale_factor = scale_factor
+        self.mouse_button_pressed = False
+        self.initial_mouse_x, self.initial_mouse_y = 0, 0
+
+    def handle_events(self, on_key=None):
+        # on_key, if given, is called with every KEYDOWN event
+        import pygame
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                pygame.quit()
+                sys.exit()
+            elif event.type == pygame.KEYDOWN and on_key is not None:
+                on_key(event)
+            elif event.type == pygame.MOUSEBUTTONDOWN:
+                if event.button == 1:
+                    self.handle_left_click()
+                elif event.button == 4:
+                    self.handle_scroll_up()
+                elif event.button == 5:
+                    self.handle_scroll_down()
+            elif event.type == pygame.MOUSEBUTTONUP and event.button == 1:
+                self.handle_left_release()
+
+    def handle_left_click(self):
+        import pygame
+        self.initial_mouse_x, self.initial_mouse_y = pygame.mouse.get_pos()
+        self.mouse_button_pressed = True
+
+    def handle_scroll_up(self):
+        self.current_scale_factor *= 1.1
+
+    def handle_scroll_down(self):
+        self.current_scale_factor /= 1.1
+
+    def handle_left_release(self):
+        self.mouse_button_pressed = False
+
+    def handle_mouse_drag(self):
+        if self.mouse_button_pressed:
+            import pygame
+            current_mouse_x, current_mouse_y = pygame.mouse.get_pos()
+            self.offset_x -= current_mouse_x - self.initial_mouse_x
+            self.offset_y -= current_mouse_y - self.initial_mouse_y
+            self.initial_mouse_x, self.initial_mouse_y = current_mouse_x, current_mouse_y
+
+# Class to manage the main window
+class MainWindow:
+    """The physics runs on a PhysicsWorker thread: the window draws the latest
+    snapshot at its own frame rate, so panning and zooming stay smooth.
+
+    steps_per_frame is the number of physics steps requested per frame, or
+    None to step as fast as possible. With interpolate, the bodies are moved
+    smoothly between the last two snapshots. Drawing is vectorized: off-screen
+    bodies are culled and bodies smaller than splat_radius become single pixels.
+
+    With a profiler, the phases of the frames and of the physics steps are
+    timed, and hud overlays their rolling percentiles (F3 toggles it).
+
+    view is a name of VIEW_MODES; the V key cycles through them. The
+    nonlinear views follow the zoom relative to the initial scale_factor.
+
+    diagnostics (a diagnostics.Diagnostics) is recorded every
+    diagnostics_every steps and its energy drift drawn as a sparkline. When
+    one of its alarms pauses the simulation, P resumes it and the drifts are
+    measured again from there; P also pauses and resumes at any time.
+    """
+
+    def __init__(self, width, height, fps, window_name, system, time_step, scale_factor, force_engine=None, integrator=None,
+                 steps_per_frame=1, interpolate=True, splat_radius=1, profiler=None, hud=False, view="linear",
+                 diagnostics=None, diagnostics_every=10):
+        self.width = width
+        self.height = height
+        self.fps = fps
+        self.window_name = window_name
+        if hud and profiler is None:
+            profiler = Profiler()
+        self.simulation = Simulation(system, time_step, force_engine, integrator, profiler)
+        self.profiler = self.simulation.profiler
+        self.hud = hud
+        self.diagnostics = diagnostics
+        if diagnostics is not None:
+            self.simulation.add_observer(diagnostics, diagnostics_every)
+        self.event_manager = EventManager(scale_factor)
+        self.physics = PhysicsWorker(self.simulation, steps_per_frame)
+        self.interpolate = interpolate
+        # Bodies with a smaller display radius are drawn as single pixels
+        self.splat_radius = splat_radius
+        self.culled_count = 0
+        if view not in VIEW_MODES:
+            raise ValueError(f"Unknown view {view!r}, choose from {', '.join(VIEW_MODES)}")
+        # One instance per view, each keeping its own cached camera constants
+        self.projections = {name: projection() for name, projection in VIEW_MODES.items()}
+        self.view = view
+
+        import pygame
+        pygame.init()
+        self.screen = pygame.display.set_mode((self.width, self.height))
+        pygame.display.set_caption(self.window_name)
+        self.clock = pygame.time.Clock()
+        self.font = None
+
+    def handle_key(self, event):
+        import pygame
+        if event.key == pygame.K_F3 and self.profiler.enabled:
+            self.hud = not self.hud
+        elif event.key == pygame.K_v:
+            views = list(self.projections)
+            self.view = views[(views.index(self.view) + 1) % len(views)]
+        elif event.key == pygame.K_p:
+            if self.simulation.paused and self.diagnostics is not None:
+                self.diagnostics.reset_reference(self.simulation)
+            self.simulation.paused = not self.simulation.paused
+
+    def run(self):
+        import pygame
+        profiler = self.profiler
+        self.physics.start()
+        while True:
+            with profiler.phase("events"):
+                self.event_manager.handle_events(self.handle_key)
+                self.physics.request_frame()
+                self.event_manager.handle_mouse_drag()
+
+            with profiler.phase("draw"):
+                self.draw_objects()
+                if self.hud:
+                    self.draw_hud()
+                if self.diagnostics is not None:
+                    self.draw_diagnostics()
+
+            with profiler.phase("flip"):
+                pygame.display.flip()
+            self.clock.tick(self.fps)
+
+    def translate_position(self, x, y):
+        # Rounded down like the // of the original translate_coordinates, and like project_positions
+        inverse_scale = 1 / self.event_manager.current_scale_factor
+        translated_x = math.floor(x * inverse_scale) + self.width // 2 - self.event_manager.offset_x
+        translated_y = math.floor(y * inverse_scale) + self.height // 2 - self.event_manager.offset_y
+        return translated_x, translated_y
+
+    def translate_coordinates(self, obj):
+        return self.translate_position(obj.x, obj.y)
+
+    def project(self, x, y, key=None):
+        return self.projections[self.view].project(x, y, self.event_manager, self.width, self.height, key)
+
+    def draw_objects(self, cache=True):
+        snapshot, x, y = self.physics.positions(self.interpolate)
+        # Unblended positions of a snapshot already drawn are not projected again
+        key = snapshot.step_count if cache and x is snapshot.x else None
+        screen_x, screen_y = self.project(x, y, key)
+        self.culled_count = draw_bodies(self.screen, screen_x, screen_y, snapshot.display_radius, snapshot.color, self.splat_radius)
+        self.profiler.set("culled bodies", self.culled_count)
+
+    def draw_hud(self):
+        import pygame
+        if self.font is None:
+            self.font = pygame.font.Font(None, 18)
+        lines = [f"{self.clock.get_fps():.1f} fps, {len(self.simulation.system.bodies)} bodies, {self.view} view"] + self.profiler.report()
+        for row, line in enumerate(lines):
+            self.screen.blit(self.font.render(line, True, (200, 200, 200)), (8, 8 + 14 * row))
+
+    def draw_diagnostics(self):
+        import pygame
+        if self.font is None:
+            self.font = pygame.font.Font(None, 18)
+        top = self.height - 56
+        draw_sparkline(self.screen, self.diagnostics.history("energy_drift"), (8, top, 200, 32))
+        latest = self.diagnostics.latest()
+        if self.simulation.paused:
+            text = f"paused: {self.diagnostics.alarm}, P resumes" if self.diagnostics.alarm else "paused, P resumes"
+        elif latest is not None:
+            text = f"energy drift {latest['energy_drift']:.2e}, virial ratio {latest['virial_ratio']:.3f}"
+        else:
+            text = "energy drift -"
+        self.screen.blit(self.font.render(text, True, (200, 200, 200)), (8, top + 38))
+
+
+def project_positions(x, y, event_manager, width, height):
+    # Same transformation as MainWindow.translate_position, for all the bodies at once
+    inverse_scale = 1 / event_manager.current_scale_factor
+    screen_x = np.floor(x * inverse_scale) + (width // 2 - event_manager.offset_x)
+    screen_y = np.floor(y * inverse_scale) + (height // 2 - event_manager.offset_y)
+    return screen_x, screen_y
+
+
+def draw_bodies(screen, screen_x, screen_y, radius, color, splat_radius=1):
+    """Clear the screen and draw the bodies at the given screen positions, return the number of culled bodies."""
+    import pygame
+    width, height = screen.get_size()
+    screen.fill((0, 0, 0))
+
+    # Cull the bodies whose disk does not touch the window
+    visible = np.flatnonzero((screen_x + radius >= 0) & (screen_x - radius < width)
+                             & (screen_y + radius >= 0) & (screen_y - radius < height))
+    culled_count = len(screen_x) - len(visible)
+    screen_x = screen_x[visible].astype(np.int64)
+    screen_y = screen_y[visible].astype(np.int64)
+    radius = radius[visible]
+    color = color[visible]
+
+    # Bodies too small to be drawn as circles are written directly into the pixel buffer
+    points = (radius < splat_radius) & (screen_x >= 0) & (screen_x < width) & (screen_y >= 0) & (screen_y < height)
+    if points.any():
+        pixels = pygame.surfarray.pixels3d(screen)
+        pixels[screen_x[points], screen_y[points]] = color[points]
+        del pixels
+
+    # A circle hidden by a later circle of the same size at the same place is drawn only once
+    circles = np.flatnonzero(~points & (radius >= splat_radius))
+    if len(circles):
+        key = np.stack((screen_x[circles], screen_y[circles], radius[circles].astype(np.int64)))
+        _, last = np.unique(key[:, ::-1], axis=1, return_index=True)
+        circles = circles[np.sort(len(circles) - 1 - last)]
+        draw_circle = pygame.draw.circle
+        for circle_x, circle_y, circle_color, circle_radius in zip(
+                screen_x[circles].tolist(), screen_y[circles].tolist(), color[circles].tolist(), radius[circles].tolist()):
+            draw_circle(screen, circle_color, (circle_x, circle_y), circle_radius)
+    return culled_count
+
+
+def draw_sparkline(screen, values, rect, color=(120, 200, 120)):
+    """Draw values (oldest first) as a line scaled to fill rect = (left, top, width, height)."""
+    import pygame
+    left, top, width, height = rect
+    values = values[np.isfinite(values)][-width:]
+    if len(values) < 2:
+        return
+    low, high = values.min(), values.max()
+    span = high - low if high > low else 1.0
+    points_x = left + np.linspace(0, width - 1, len(values))
+    points_y = top + (height - 1) * (1 - (values - low) / span)
+    pygame.draw.lines(screen, color, False, np.column_stack((points_x, points_y)).tolist())
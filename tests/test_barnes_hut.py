@@ -0,0 +1,27 @@
+# Barnes-Hut tree code
+import numpy as np
+import pytest
+
+from nbody.barnes_hut import BarnesHutEngine
+from nbody.forces import VectorizedForceEngine
+
+G = 6.674e-11
+
+
+def test_a_body_is_never_pulled_by_a_node_holding_it():
+    # A and B share a cell of side 1, whose centre of mass is 1.26 away from B
+    x = np.array([0.0, 0.9, 128.0])
+    y = np.array([0.0, 0.9, 128.0])
+    mass = np.array([100.0, 1.0, 1.0])
+    ax, ay = BarnesHutEngine(theta=0.9, leaf_size=1).compute_accelerations(x, y, mass, G)
+    exact_ax, exact_ay = VectorizedForceEngine().compute_accelerations(x, y, mass, G)
+    # A and B are summed body by body, C sees them through the multipole of their cell
+    assert np.allclose(ax[:2], exact_ax[:2], rtol=1e-12, atol=0)
+    assert np.allclose(ay[:2], exact_ay[:2], rtol=1e-12, atol=0)
+    assert np.allclose(ax, exact_ax, rtol=1e-6, atol=0)
+
+
+@pytest.mark.parametrize("theta", [1.0, 1.5, -0.1])
+def test_opening_angles_that_can_hold_the_body_are_rejected(theta):
+    with pytest.raises(ValueError):
+        BarnesHutEngine(theta=theta)
@@ -0,0 +1,79 @@
+# Checkpoint and restart
+import numpy as np
+import pytest
+
+from nbody.checkpoint import load_checkpoint, save_checkpoint
+from nbody.core import Simulation, SystemGenerator
+from nbody.diagnostics import Diagnostics
+from nbody.initial_conditions import generate_bodies
+from nbody.integrators import INTEGRATORS, make_integrator
+
+
+@pytest.mark.parametrize("integrator", sorted(INTEGRATORS))
+def test_restart_continues_bit_for_bit(integrator, tmp_path):
+    path = tmp_path / "state.ckpt"
+    original = Simulation(generate_bodies("plummer", 64, seed=4), 1e7, integrator=make_integrator(integrator))
+    for _ in range(5):
+        original.step()
+    save_checkpoint(str(path), original)
+    for _ in range(5):
+        original.step()
+
+    restarted = load_checkpoint(str(path))
+    for _ in range(5):
+        restarted.step()
+
+    assert restarted.step_count == original.step_count
+    assert restarted.elapsed_time == original.elapsed_time
+    original_arrays = original.system.bodies.arrays()
+    restarted_arrays = restarted.system.bodies.arrays()
+    assert original_arrays.keys() == restarted_arrays.keys()
+    for name, array in original_arrays.items():
+        assert np.array_equal(restarted_arrays[name], array), name
+    assert np.array_equal(restarted.system.bodies.color, original.system.bodies.color)
+
+
+def test_restart_with_diagnostics_continues_bit_for_bit_from_the_same_drift_reference(tmp_path):
+    path = tmp_path / "state.ckpt"
+    original = Simulation(generate_bodies("plummer", 64, seed=4), 1e7)
+    diagnostics = Diagnostics()
+    original.add_observer(diagnostics, 5)
+    for _ in range(5):
+        original.step()
+    save_checkpoint(str(path), original)
+    for _ in range(5):
+        original.step()
+
+    restarted = load_checkpoint(str(path))
+    restarted_diagnostics = Diagnostics()
+    restarted.add_observer(restarted_diagnostics, 5)
+    for _ in range(5):
+        restarted.step()
+
+    for name, array in original.system.bodies.arrays().items():
+        assert np.array_equal(restarted.system.bodies.arrays()[name], array), name
+    assert restarted_diagnostics.latest() == diagnostics.latest()
+    assert diagnostics.latest()["energy_drift"] > 0
+
+
+def test_checkpoint_keeps_the_recipe_of_the_initial_conditions(tmp_path):
+    path = tmp_path / "state.ckpt"
+    generator = SystemGenerator(50, False, seed=11, distribution="disk")
+    simulation = Simulation(generator.generate_bodies(), 1e7)
+    simulation.initial_conditions = generator.recipe()
+    simulation.step()
+    save_checkpoint(str(path), simulation)
+
+    recipe = load_checkpoint(str(path)).initial_conditions
+    assert recipe == generator.recipe()
+    initial = generator.generate_bodies().arrays()
+    regenerated = SystemGenerator.from_recipe(recipe).generate_bodies().arrays()
+    for name, array in initial.items():
+        assert np.array_equal(regenerated[name], array), name
+
+
+def test_recipe_of_an_unseeded_generator_rebuilds_the_same_system():
+    generator = SystemGenerator(20, False)
+    rebuilt = SystemGenerator.from_recipe(generator.recipe())
+    for obj, copy in zip(generator.generate_system(), rebuilt.generate_system()):
+        assert (obj.mass, obj.x, obj.y, obj.vx, obj.vy, obj.color) == (copy.mass, copy.x, copy.y, copy.vx, copy.vy, copy.color)
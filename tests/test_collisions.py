@@ -0,0 +1,78 @@
+# Merges and broad-phase collision detection
+import math
+
+import numpy as np
+
+from nbody.collisions import connected_components, find_overlapping_pairs
+from nbody.core import CelestialObject, Simulation, SystemGenerator
+
+
+def brute_force_pairs(x, y, radius):
+    i, j = np.triu_indices(len(x), 1)
+    touching = (x[j] - x[i]) ** 2 + (y[j] - y[i]) ** 2 < (radius[i] + radius[j]) ** 2
+    return set(zip(i[touching].tolist(), j[touching].tolist()))
+
+
+def test_merge_objects_conserves_mass_momentum_and_volume():
+    obj1 = CelestialObject(3e24, 1e9, -2e9, 1e3, -4e2, 5000, (255, 0, 0))
+    obj2 = CelestialObject(1e24, 1.1e9, -2e9, -2e3, 7e2, 2000, (0, 0, 255))
+    simulation = Simulation([obj1, obj2], 1.0)
+
+    merged = simulation.merge_objects(obj1, obj2)
+
+    assert math.isclose(merged.mass, obj1.mass + obj2.mass)
+    assert math.isclose(merged.mass * merged.vx, obj1.mass * obj1.vx + obj2.mass * obj2.vx)
+    assert math.isclose(merged.mass * merged.vy, obj1.mass * obj1.vy + obj2.mass * obj2.vy)
+    assert math.isclose(merged.real_radius ** 3, obj1.real_radius ** 3 + obj2.real_radius ** 3)
+    # Position and color of the most massive object
+    assert (merged.x, merged.y, merged.color) == (obj1.x, obj1.y, obj1.color)
+
+
+def test_find_overlapping_pairs_matches_brute_force():
+    rng = np.random.default_rng(0)
+    x = rng.uniform(-100, 100, 500)
+    y = rng.uniform(-100, 100, 500)
+    radius = rng.uniform(0.5, 6, 500)
+    expected = brute_force_pairs(x, y, radius)
+    assert expected
+
+    for chunk_size in (1 << 20, 7):
+        i, j = find_overlapping_pairs(x, y, radius, chunk_size=chunk_size)
+        assert np.all(i < j)
+        assert len(i) == len(expected)
+        assert set(zip(i.tolist(), j.tolist())) == expected
+
+
+def test_chain_of_touching_bodies_collapses_into_one():
+    # 0 touches 1 and 1 touches 2, but 0 and 2 are apart
+    x = np.array([0.0, 1.5, 3.0])
+    y = np.zeros(3)
+    radius = np.ones(3)
+    i, j = find_overlapping_pairs(x, y, radius)
+    assert set(zip(i.tolist(), j.tolist())) == {(0, 1), (1, 2)}
+    assert connected_components(3, i, j).tolist() == [0, 0, 0]
+
+    # The same chain of real bodies merges into one in a single step
+    spacing = 1.5 * CelestialObject(1e24, 0.0, 0.0, 0.0, 0.0, 5000, (255, 255, 255)).real_radius
+    objects = [CelestialObject(1e24, k * spacing, 0.0, 0.0, 0.0, 5000, (255, 255, 255)) for k in range(3)]
+    simulation = Simulation(objects, 1.0)
+    simulation.resolve_collisions()
+    bodies = simulation.system.bodies
+    assert len(bodies) == 1
+    assert math.isclose(bodies.mass[0], 3e24)
+
+
+def test_zero_speed_run_loses_bodies_to_merges():
+    bodies = SystemGenerator(200, True, seed=1, extent=1e11).generate_bodies()
+    total_mass = bodies.mass.sum()
+    simulation = Simulation(bodies, 1e4)
+    for _ in range(100):
+        simulation.step()
+
+    bodies = simulation.system.bodies
+    assert len(bodies) < 200
+    assert math.isclose(bodies.mass.sum(), total_mass)
+    # Started at rest: the merges keep the total momentum at zero (up to rounding)
+    scale = float(np.sum(bodies.mass * np.hypot(bodies.vx, bodies.vy)))
+    assert abs(float(np.sum(bodies.mass * bodies.vx))) < 1e-9 * scale
+    assert abs(float(np.sum(bodies.mass * bodies.vy))) < 1e-9 * scale
@@ -0,0 +1,42 @@
+# Conserved quantities and drifts
+import numpy as np
+import pytest
+
+from nbody.core import Simulation
+from nbody.diagnostics import Diagnostics
+from nbody.engines import make_force_engine
+from nbody.initial_conditions import generate_bodies
+
+G = 6.674e-11
+
+
+@pytest.mark.parametrize("engine", ["direct", "softened", "barnes-hut", "pm", "p3m"])
+def test_potential_does_not_change_the_accelerations(engine):
+    # GravitationalSystem reuses the accelerations of compute_potential() in the next step
+    bodies = generate_bodies("plummer", 300, seed=5)
+    plain = make_force_engine(engine).compute_accelerations(bodies.x, bodies.y, bodies.mass, G)
+    ax, ay, _ = make_force_engine(engine).compute_accelerations(bodies.x, bodies.y, bodies.mass, G, potential=True)
+    assert np.array_equal(ax, plain[0])
+    assert np.array_equal(ay, plain[1])
+
+
+def test_conservation_drift_shares_the_reference_of_the_diagnostics():
+    simulation = Simulation(generate_bodies("plummer", 200, seed=6), 1e7)
+    diagnostics = Diagnostics()
+    simulation.add_observer(diagnostics, 5)
+    for _ in range(5):
+        simulation.step()
+    reference = simulation.drift_reference
+    assert reference is not None
+    for _ in range(5):
+        simulation.step()
+
+    latest = diagnostics.latest()
+    evaluations = simulation.system.force_evaluations
+    drift = simulation.conservation_drift()
+    # One evaluation of the engine, no separate energy pass
+    assert simulation.system.force_evaluations == evaluations + 200
+    assert simulation.drift_reference is reference
+    assert drift["energy"] == latest["energy_drift"] > 0
+    assert drift["momentum"] == latest["momentum_drift"]
+    assert drift["angular-momentum"] == latest["angular_momentum_drift"]
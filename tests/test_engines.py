@@ -0,0 +1,99 @@
+# Force engines against the direct sum
+import numpy as np
+import pytest
+
+from nbody.engines import make_force_engine
+from nbody.initial_conditions import generate_bodies
+
+G = 6.674e-11
+
+
+def relative_errors(engine, bodies, exact):
+    ax, ay = engine.compute_accelerations(bodies.x, bodies.y, bodies.mass, G)
+    return np.hypot(ax - exact[0], ay - exact[1]) / np.hypot(*exact)
+
+
+@pytest.fixture(scope="module", params=["plummer", "disk"])
+def bodies_and_direct_sum(request):
+    bodies = generate_bodies(request.param, 2000, seed=3)
+    return bodies, make_force_engine("direct").compute_accelerations(bodies.x, bodies.y, bodies.mass, G)
+
+
+def test_direct_sum_matches_the_pairwise_force_law():
+    bodies = generate_bodies("plummer", 300, seed=4)
+    x, y, mass = bodies.x, bodies.y, bodies.mass
+    dx = x[None, :] - x[:, None]
+    dy = y[None, :] - y[:, None]
+    r2 = dx * dx + dy * dy
+    np.fill_diagonal(r2, np.inf)
+    exact = (G * mass * dx * r2 ** -1.5).sum(axis=1), (G * mass * dy * r2 ** -1.5).sum(axis=1)
+    assert relative_errors(make_force_engine("direct", block_size=64), bodies, exact).max() < 1e-12
+
+
+@pytest.mark.parametrize("engine, options, max_error", [
+    ("softened", {}, 1e-12),
+    ("parallel", {"workers": 2, "tile_size": 256}, 1e-12),
+])
+def test_exact_engines_match_the_direct_sum(bodies_and_direct_sum, engine, options, max_error):
+    bodies, exact = bodies_and_direct_sum
+    engine = make_force_engine(engine, **options)
+    try:
+        assert relative_errors(engine, bodies, exact).max() < max_error
+    finally:
+        if hasattr(engine, "close"):
+            engine.close()
+
+
+@pytest.mark.parametrize("engine, median_error", [("barnes-hut", 2e-3), ("p3m", 1e-2)])
+def test_approximate_engines_stay_close_to_the_direct_sum(bodies_and_direct_sum, engine, median_error):
+    bodies, exact = bodies_and_direct_sum
+    assert np.median(relative_errors(make_force_engine(engine), bodies, exact)) < median_error
+
+
+@pytest.mark.parametrize("accumulate", ["float64", "float32"])
+def test_float32_error_stays_within_the_documented_bound(bodies_and_direct_sum, accumulate):
+    # SoftenedForceEngine lists 2e-6 (median) and 9e-4 (max) for 20000 bodies
+    bodies, exact = bodies_and_direct_sum
+    errors = relative_errors(make_force_engine("softened", dtype="float32", accumulate=accumulate), bodies, exact)
+    assert np.median(errors) < 2e-6
+    assert errors.max() < 1e-3
+    # Single precision is used, not silently skipped
+    assert np.median(errors) > 1e-9
+
+
+MESH_OPTIONS = [
+    {},
+    {"boundary": "periodic", "box": (-4e14, -4e14, 8e14)},
+]
+
+
+@pytest.mark.parametrize("engine", ["pm", "p3m"])
+@pytest.mark.parametrize("options", MESH_OPTIONS)
+def test_mesh_forces_are_symmetric(engine, options):
+    # The pulls of two bodies on each other are opposite
+    x, y, mass = np.array([1.3e10, 5e10]), np.array([-7e10, 1e11]), np.array([3e29, 1e30])
+    ax, ay = make_force_engine(engine, **options).compute_accelerations(x, y, mass, G)
+    assert abs(mass @ ax) < 1e-10 * mass[0] * abs(ax[0])
+    assert abs(mass @ ay) < 1e-10 * mass[0] * abs(ay[0])
+
+    # No net force on the whole system
+    bodies = generate_bodies("plummer", 2000, seed=3)
+    ax, ay = make_force_engine(engine, **options).compute_accelerations(bodies.x, bodies.y, bodies.mass, G)
+    total = np.sum(bodies.mass * np.hypot(ax, ay))
+    assert abs(bodies.mass @ ax) < 1e-12 * total
+    assert abs(bodies.mass @ ay) < 1e-12 * total
+
+
+def test_particle_mesh_gives_the_pull_between_distant_clusters():
+    # PM only resolves the smooth part of the field, which is all that acts between far-apart clusters
+    first = generate_bodies("plummer", 500, seed=1)
+    second = generate_bodies("plummer", 500, seed=2)
+    distance = 10 * np.percentile(np.hypot(first.x, first.y), 90)
+    x = np.concatenate([first.x, second.x + distance])
+    y = np.concatenate([first.y, second.y])
+    mass = np.concatenate([first.mass, second.mass])
+    exact = make_force_engine("direct").compute_accelerations(x, y, mass, G)
+    ax, ay = make_force_engine("pm").compute_accelerations(x, y, mass, G)
+    pull = mass[:500] @ ax[:500], mass[:500] @ ay[:500]
+    exact_pull = mass[:500] @ exact[0][:500], mass[:500] @ exact[1][:500]
+    assert np.hypot(pull[0] - exact_pull[0], pull[1] - exact_pull[1]) < 1e-4 * np.hypot(*exact_pull)
@@ -0,0 +1,70 @@
+# Integrators on a two-body orbit
+import numpy as np
+import pytest
+
+from nbody.core import CelestialObject, Simulation
+from nbody.integrators import INTEGRATORS, make_integrator
+
+G = 6.674e-11
+SEMI_MAJOR_AXIS = 1.5e11
+
+
+def binary(eccentricity=0.5):
+    """Two bodies starting at apocentre, and the period of their orbit."""
+    m1, m2 = 2e30, 1e30
+    total = m1 + m2
+    r = SEMI_MAJOR_AXIS * (1 + eccentricity)
+    v = np.sqrt(G * total * (1 - eccentricity) / r)
+    objects = [
+        CelestialObject(m1, -m2 / total * r, 0.0, 0.0, -m2 / total * v, 1000, (255, 255, 255)),
+        CelestialObject(m2, m1 / total * r, 0.0, 0.0, m1 / total * v, 1000, (255, 255, 255)),
+    ]
+    return objects, 2 * np.pi * np.sqrt(SEMI_MAJOR_AXIS ** 3 / (G * total))
+
+
+def energy(bodies):
+    r = np.hypot(bodies.x[0] - bodies.x[1], bodies.y[0] - bodies.y[1])
+    return 0.5 * bodies.mass @ (bodies.vx ** 2 + bodies.vy ** 2) - G * bodies.mass[0] * bodies.mass[1] / r
+
+
+def errors_after_one_period(integrator, steps):
+    """Distance to the starting positions (relative to the semi-major axis) and relative energy error."""
+    objects, period = binary()
+    simulation = Simulation(objects, period / steps, integrator=make_integrator(integrator))
+    bodies = simulation.system.bodies
+    x, y, initial_energy = bodies.x.copy(), bodies.y.copy(), energy(bodies)
+    for _ in range(steps):
+        simulation.step()
+    bodies = simulation.system.bodies
+    assert len(bodies) == 2
+    position_error = np.hypot(bodies.x - x, bodies.y - y).max() / SEMI_MAJOR_AXIS
+    return position_error, abs(energy(bodies) / initial_energy - 1)
+
+
+# Largest errors after one period of 400 steps, eccentricity 0.5 (about 3 times the measured ones)
+TOLERANCES = {
+    "euler": (3e-3, 1e-7),
+    "leapfrog": (3e-3, 1e-12),
+    "yoshida4": (1e-5, 1e-12),
+    "rk45": (1e-8, 1e-8),
+    "block": (1e-5, 1e-6),
+}
+
+
+def test_every_integrator_has_a_tolerance():
+    assert set(TOLERANCES) == set(INTEGRATORS)
+
+
+@pytest.mark.parametrize("integrator", sorted(TOLERANCES))
+def test_integrator_error_on_a_two_body_orbit(integrator):
+    position_error, energy_error = errors_after_one_period(integrator, 400)
+    max_position_error, max_energy_error = TOLERANCES[integrator]
+    assert position_error < max_position_error
+    assert energy_error < max_energy_error
+
+
+@pytest.mark.parametrize("integrator, order", [("euler", 1), ("leapfrog", 2), ("yoshida4", 4)])
+def test_fixed_step_integrators_converge_at_their_order(integrator, order):
+    coarse, _ = errors_after_one_period(integrator, 200)
+    fine, _ = errors_after_one_period(integrator, 400)
+    assert coarse / fine > 0.9 * 2 ** order
@@ -0,0 +1,50 @@
+# Trajectory files written and read back
+import numpy as np
+import pytest
+
+from nbody.core import Simulation
+from nbody.initial_conditions import generate_bodies
+from nbody.trajectory import POSITION_FORMATS, TrajectoryReader, TrajectoryWriter
+
+
+def record_run(path, position_format, steps=6, every=2):
+    """Run a simulation recorded to path, and return the frames kept in memory at the same steps."""
+    simulation = Simulation(generate_bodies("plummer", 300, seed=9), 1e7)
+    expected = []
+
+    def keep(simulation):
+        bodies = simulation.system.bodies
+        expected.append((simulation.step_count, simulation.elapsed_time, bodies.x.copy(), bodies.y.copy(),
+                         bodies.display_radius.copy(), bodies.color.copy()))
+
+    with TrajectoryWriter(str(path), position_format) as writer:
+        simulation.add_observer(writer, every)
+        simulation.add_observer(keep, every)
+        for _ in range(steps):
+            simulation.step()
+    return expected
+
+
+@pytest.mark.parametrize("position_format", sorted(POSITION_FORMATS))
+def test_trajectory_round_trip(tmp_path, position_format):
+    path = tmp_path / "run.traj"
+    expected = record_run(path, position_format)
+    reader = TrajectoryReader(str(path))
+    assert reader.position_format == position_format
+    assert len(reader) == len(expected) == 3
+
+    for frame, (step, time, x, y, display_radius, color) in zip(reader, expected):
+        assert (frame.step, frame.time) == (step, time)
+        assert np.array_equal(frame.display_radius, display_radius.astype(np.float32))
+        assert np.array_equal(frame.color, color)
+        if position_format == "float64":
+            assert np.array_equal(frame.x, x) and np.array_equal(frame.y, y)
+        elif position_format == "float32":
+            assert np.array_equal(frame.x, x.astype(np.float32)) and np.array_equal(frame.y, y.astype(np.float32))
+        else:
+            # Quantized relative to the bounding square of the frame: at most half a quantum away
+            quantum = max(np.ptp(x), np.ptp(y)) / np.iinfo(POSITION_FORMATS[position_format]).max
+            error = max(np.abs(frame.x - x).max(), np.abs(frame.y - y).max())
+            assert error <= 0.5 * quantum * (1 + 1e-9)
+            assert error > 0.25 * quantum
+